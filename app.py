@@ -1,17 +1,21 @@
-import nltk
-nltk.download('vader_lexicon')
 import sentiment
 import streamlit as st
 import preprocessor
+import cache
+import incremental
+import memo
+import profiling
 import helper
+import charts
 import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import matplotlib.font_manager as fm
 from matplotlib.font_manager import FontProperties
 from pathlib import Path
 import warnings
-import sentiment
+import json
+import zoneinfo
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
 
 emoji_font = FontProperties(fname=r'C:\Windows\Fonts\seguiemj.ttf')
@@ -67,8 +71,13 @@ with st.expander("ℹ️ How to Use This Tool", expanded=True):
     * 😀 Emoji analysis
     
     ### Privacy Note:
-    Your chat data is processed locally and is not stored anywhere.
     """)
+    if cache.ENABLED:
+        st.markdown("Parsed chats and analysis results are cached on the server in "
+                    f"`{cache.CACHE_DIR}` so repeat uploads load quickly. Use "
+                    "**Delete cached data** in the sidebar to remove them.")
+    else:
+        st.markdown("Your chat data is processed in memory and is not written to disk.")
 
 st.markdown("---")
 
@@ -76,17 +85,68 @@ st.sidebar.markdown("### 📁 Upload Chat File")
 
 uploaded_file = st.sidebar.file_uploader("Choose a WhatsApp chat export file", type=['txt'])
 
-if uploaded_file is not None:
+# Off by default: tracing allocations slows parsing and the helpers down
+profiling.track_memory(st.sidebar.checkbox("Track memory in the Performance panel", value=profiling.memory_tracking()))
+
+# Shows counts and activity charts at once and fills in words, emoji and
+# sentiment as they finish, with a sampled sentiment estimate meanwhile
+progressive = st.sidebar.checkbox("Progressive mode (quick results first)", value=True)
+
+
+AS_EXPORTED = 'As exported'
+TIMEZONES = [AS_EXPORTED] + sorted(zoneinfo.available_timezones())
+TIMELINE_BUCKETS = {'Month': 'month', 'Week': 'week', 'Quarter': 'quarter', 'Day': 'day'}
+HEATMAP_SLOTS = {'1 hour': 'hour', '30 minutes': 'slot30', '15 minutes': 'slot15'}
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_chat(chat_key, _uploaded_file):
+    # Keyed by the export's content hash; reruns reuse the same ChatIndex.
+    # A re-export of a chat seen before only has its new messages parsed.
+    return incremental.ingest(_uploaded_file, chat_key)
+
+
+@st.cache_resource(show_spinner=False)
+def sentiment_ready():
+    # Builds VADER once per server process; False when the lexicon is missing
     try:
-        with st.spinner('Reading file...'):
-            bytes_data = uploaded_file.getvalue()
-            try:
-                data = bytes_data.decode("utf-8")
-            except UnicodeDecodeError:
-                data = bytes_data.decode("utf-16")
+        sentiment.get_analyzer()
+        return True
+    except LookupError as e:
+        print(f"Error loading VADER lexicon: {e}")
+        return False
+
+
+if cache.ENABLED and st.sidebar.button("Delete cached data"):
+    removed = cache.purge()
+    memo.clear()
+    load_chat.clear()
+    st.sidebar.success(f"Deleted {removed} cached files.")
 
+
+@st.cache_resource(show_spinner=False)
+def analysis_pool():
+    # Background threads for the slow sections in progressive mode
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix='analysis')
+
+
+def schedule(func, *args, **kwargs):
+    # Future for func(...): run in the background in progressive mode, right
+    # away otherwise, so both modes share one page layout
+    if progressive:
+        return analysis_pool().submit(func, *args, **kwargs)
+    future = Future()
+    future.set_result(func(*args, **kwargs))
+    return future
+
+
+if uploaded_file is not None:
+    try:
         with st.spinner('Processing chat data...'):
-            df = preprocessor.preprocess(data)
+            uploaded_file.seek(0)
+            chat_key = cache.content_hash(uploaded_file)
+            chat = load_chat(chat_key, uploaded_file)
+            df = chat.df if chat is not None else None
             
         if df is None or df.empty:
             st.error("No valid chat data could be extracted.")
@@ -94,61 +154,97 @@ if uploaded_file is not None:
             st.stop()
         
         st.success(f"Successfully processed {len(df)} messages!")
-
-        user_list = df['user'].unique().tolist()
+        if 'date_format' in df.attrs:
+            st.sidebar.caption(f"Date format: {preprocessor.describe_date_format(df.attrs['date_format'])}")
+        cache_info = cache.cache_stats()
+        st.sidebar.caption(f"Parsed-chat cache: {cache_info['hits']} hits, {cache_info['misses']} misses")
+        memo_info = memo.memo_stats()
+        st.sidebar.caption(f"Results cache: {memo_info['hits']} hits, {memo_info['misses']} misses, {memo_info['entries']} entries")
+
+        user_list = chat.users.tolist()
         if 'group_notification' in user_list:
             user_list.remove('group_notification')
-        user_list.sort()
         user_list.insert(0, "Overall")
 
         selected_user = st.sidebar.selectbox("Show analysis for:", user_list)
 
+        with st.sidebar.expander("Time settings"):
+            # Exports carry the phone's local time; shifting needs both zones
+            source_tz = st.selectbox("Chat was exported in", TIMEZONES)
+            viewer_tz = st.selectbox("Show times in", TIMEZONES)
+            timeline_label = st.selectbox("Timeline granularity", list(TIMELINE_BUCKETS))
+            heatmap_slot = HEATMAP_SLOTS[st.selectbox("Heatmap resolution", list(HEATMAP_SLOTS))]
+        timeline_bucket = TIMELINE_BUCKETS[timeline_label]
+        source_tz = None if source_tz == AS_EXPORTED else source_tz
+        viewer_tz = None if viewer_tz == AS_EXPORTED else viewer_tz
+
         if st.sidebar.button("Analyze Chat"):
             with st.spinner("Analyzing chat data..."):
                 try:
+                    # future -> functions filling a placeholder with its result
+                    deferred = {}
+                    shown = set()
+                    # Sentiment progress reported by a worker thread
+                    scoring = {}
+
+                    def later(future, slot, fill):
+                        if not future.done():
+                            slot.caption("Still working...")
+                        deferred.setdefault(future, []).append(lambda result: fill(slot, result))
+
                     # Stats Area
                     with st.container():
-                        num_messages, words, num_media_messages, num_links = helper.fetch_stats(selected_user, df)
+                        stats = schedule(helper.fetch_stats, selected_user, chat)
                         st.title("Chat Statistics")
                         col1, col2, col3, col4 = st.columns(4)
 
+                        # Message and media counts need no pass over the text
                         with col1:
                             st.header("Total Messages")
-                            st.title(f"{num_messages:,}")
+                            st.title(f"{chat.total(chat.message_counts.to_numpy(), selected_user):,}")
                         with col2:
                             st.header("Total Words")
-                            st.title(f"{words:,}")
+                            later(stats, st.empty(), lambda slot, s: slot.title(f"{s[1]:,}"))
                         with col3:
                             st.header("Media Shared")
-                            st.title(f"{num_media_messages:,}")
+                            st.title(f"{chat.total(chat.media_totals, selected_user):,}")
                         with col4:
                             st.header("Links Shared")
-                            st.title(f"{num_links:,}")
+                            later(stats, st.empty(), lambda slot, s: slot.title(f"{s[3]:,}"))
+
+                    # Every chart starts rendering now, in the background
+                    chart_names = ['timeline', 'daily_timeline', 'week_activity', 'month_activity',
+                                   'activity_heatmap', 'wordcloud', 'common_words']
+                    if selected_user == 'Overall':
+                        chart_names.append('busy_users')
+                    variants = {'timeline': timeline_bucket, 'activity_heatmap': heatmap_slot}
+                    pending = {
+                        name: charts.submit(name, selected_user, chat, viewer_tz, source_tz, variants.get(name))
+                        for name in chart_names
+                    }
+
+                    def show_chart(name):
+                        png = pending[name].result()
+                        if png:
+                            st.image(png, use_column_width=True)
+
+                    def fill_image(slot, png):
+                        if png:
+                            slot.image(png, use_column_width=True)
+                        else:
+                            slot.empty()
 
                     # Timeline Analysis
                     with st.container():
                         col1, col2 = st.columns(2)
                         
                         with col1:
-                            st.title("Monthly Activity")
-                            timeline = helper.monthly_timeline(selected_user, df)
-                            if not timeline.empty:
-                                fig, ax = plt.subplots(figsize=(10, 4))
-                                ax.plot(timeline['time'], timeline['message'], color='green', linewidth=2)
-                                plt.xticks(rotation=45)
-                                plt.tight_layout()
-                                st.pyplot(fig)
+                            st.title("Monthly Activity" if timeline_bucket == 'month' else f"Activity per {timeline_label.lower()}")
+                            show_chart('timeline')
                                 
                         with col2:
                             st.title("Daily Activity")
-                            daily_timeline = helper.daily_timeline(selected_user, df)
-                            if not daily_timeline.empty:
-                                fig, ax = plt.subplots(figsize=(10, 4))
-                                ax.plot(daily_timeline['only_date'], daily_timeline['message'], 
-                                      color='blue', linewidth=2)
-                                plt.xticks(rotation=45)
-                                plt.tight_layout()
-                                st.pyplot(fig)
+                            show_chart('daily_timeline')
 
                     # Activity Patterns
                     with st.container():
@@ -157,78 +253,50 @@ if uploaded_file is not None:
 
                         with col1:
                             st.header("Weekly Activity")
-                            busy_day = helper.week_activity_map(selected_user, df)
-                            fig, ax = plt.subplots(figsize=(10, 4))
-                            ax.bar(busy_day.index, busy_day.values, color='purple')
-                            plt.xticks(rotation=45)
-                            plt.tight_layout()
-                            st.pyplot(fig)
+                            show_chart('week_activity')
 
                         with col2:
                             st.header("Monthly Activity")
-                            busy_month = helper.month_activity_map(selected_user, df)
-                            fig, ax = plt.subplots(figsize=(10, 4))
-                            ax.bar(busy_month.index, busy_month.values, color='orange')
-                            plt.xticks(rotation=45)
-                            plt.tight_layout()
-                            st.pyplot(fig)
+                            show_chart('month_activity')
 
                     # Heatmap
                     with st.container():
                         st.title("Weekly Activity Heatmap")
-                        user_heatmap = helper.activity_heatmap(selected_user, df)
-                        if user_heatmap.size > 0:
-                            fig, ax = plt.subplots(figsize=(12, 6))
-                            sns.heatmap(user_heatmap, cmap='YlOrRd', ax=ax)
-                            plt.tight_layout()
-                            st.pyplot(fig)
+                        show_chart('activity_heatmap')
 
                     # User Analysis
                     if selected_user == 'Overall':
                         with st.container():
                             st.title('Most Active Users')
-                            user_stats, percent_df = helper.most_busy_users(df)
+                            _, percent_df = helper.most_busy_users(chat)
                             col1, col2 = st.columns(2)
                             
                             with col1:
-                                fig, ax = plt.subplots(figsize=(10, 4))
-                                ax.bar(user_stats.index, user_stats.values, color='red')
-                                plt.xticks(rotation=45)
-                                plt.tight_layout()
-                                st.pyplot(fig)
+                                show_chart('busy_users')
                             with col2:
                                 st.dataframe(percent_df.style.format({'Percent': '{:.2f}%'}))
 
-                    # Word Analysis
+                    # Word Analysis: tokenizing every message is slow, so
+                    # these fill in when ready
                     with st.container():
                         col1, col2 = st.columns(2)
                         
                         with col1:
                             st.title("Word Cloud")
-                            word_cloud = helper.create_wordcloud(selected_user, df)
-                            if word_cloud:
-                                fig, ax = plt.subplots(figsize=(10, 10))
-                                ax.imshow(word_cloud)
-                                plt.axis('off')
-                                st.pyplot(fig)
+                            later(pending['wordcloud'], st.empty(), fill_image)
                                 
                         with col2:
                             st.title("Most Common Words")
-                            most_common_df = helper.most_common_words(selected_user, df)
-                            if not most_common_df.empty:
-                                fig, ax = plt.subplots(figsize=(10, 8))
-                                ax.barh(most_common_df[0], most_common_df[1])
-                                plt.xticks(rotation=45)
-                                plt.tight_layout()
-                                st.pyplot(fig)
+                            later(pending['common_words'], st.empty(), fill_image)
 
                     # Emoji Analysis
-                    with st.container():
-                        st.title("Emoji Analysis")
-                        emoji_df = helper.emoji_helper(selected_user, df)
-                        if not emoji_df.empty:
+                    def show_emojis(slot, emoji_df):
+                        if emoji_df.empty:
+                            slot.empty()
+                            return
+                        with slot.container():
                             col1, col2 = st.columns(2)
-                            
+
                             with col1:
                                 st.markdown("### Most Used Emojis")
                                 formatted_df = emoji_df.copy()
@@ -238,42 +306,78 @@ if uploaded_file is not None:
                                     height=400,
                                     use_container_width=True
                                 )
-                     # Sentiment Analysis
-                    with st.container():
-                          st.title("Sentiment Analysis")
-
-                          df_sentiment, sentiment_counts = sentiment.analyze_sentiment(df, selected_user)
-
-                          if selected_user == 'Overall':
-                            with st.container():
-                              st.markdown("### Sentiment by User")
-                              sentiment_by_user = df_sentiment.groupby('user')['sentiment'].value_counts().unstack().fillna(0)
-                              st.dataframe(sentiment_by_user.style.format(precision=0))
-
-
-                          if not sentiment_counts.empty:
-                               col1, col2 = st.columns(2)
-
-                               with col1:
-                                 st.markdown("### Sentiment Distribution")
-                                 fig, ax = plt.subplots()
-                                 ax.pie(
-                                    sentiment_counts['Count'], 
-                                    labels=sentiment_counts['Sentiment'], 
-                                    autopct='%1.1f%%', 
-                                    startangle=140,
-                                    colors=['green', 'red', 'grey']
-                                )
-                                 ax.axis('equal')
-                                 st.pyplot(fig)
-
-                               with col2:
-                                 st.markdown("### Sentiment Counts Table")
-                                 st.dataframe(sentiment_counts)
 
-                          else:
-                            st.info("Not enough text data to analyze sentiment.")
+                    with st.container():
+                        st.title("Emoji Analysis")
+                        later(schedule(helper.emoji_helper, selected_user, chat), st.empty(), show_emojis)
+
+                    # Sentiment Analysis
+                    def show_sentiment(slot, result):
+                        df_sentiment, sentiment_counts = result
+                        shown.add('sentiment')
+                        progress_bar.empty()
+                        with slot.container():
+                            if selected_user == 'Overall':
+                                st.markdown("### Sentiment by User")
+                                sentiment_by_user = df_sentiment.groupby('user', observed=True)['sentiment'].value_counts().unstack().fillna(0)
+                                st.dataframe(sentiment_by_user.style.format(precision=0))
+
+                            if not sentiment_counts.empty:
+                                col1, col2 = st.columns(2)
+
+                                with col1:
+                                    st.markdown("### Sentiment Distribution")
+                                    pie = charts.chart_png('sentiment', selected_user, chat)
+                                    if pie:
+                                        st.image(pie, use_column_width=True)
+
+                                with col2:
+                                    st.markdown("### Sentiment Counts Table")
+                                    st.dataframe(sentiment_counts)
+
+                            else:
+                                st.info("Not enough text data to analyze sentiment.")
+
+                    def show_preview(slot, png):
+                        # Only until the full analysis is in
+                        if 'sentiment' in shown or not png:
+                            return
+                        _, scored = sentiment.sample_sentiment(chat, selected_user)
+                        with slot.container():
+                            col1, _ = st.columns(2)
+                            with col1:
+                                st.markdown("### Early Estimate")
+                                st.image(png, use_column_width=True)
+                                st.caption(f"From {scored:,} sampled messages; the bars are 95% intervals. "
+                                           "The full analysis replaces this when it finishes.")
 
+                    with st.container():
+                        st.title("Sentiment Analysis")
+                        if not sentiment_ready():
+                            st.warning("The VADER lexicon is not installed. Run `sh setup.sh` (or `python -m nltk.downloader -d nltk_data vader_lexicon`) and restart the app.")
+                        else:
+                            progress_bar = st.progress(0.0, text="Scoring messages...")
+                            sentiment_slot = st.empty()
+                            # Worker threads cannot draw; the loop below shows their progress
+                            if progressive:
+                                track = lambda done, total: scoring.update(done=done, total=total)
+                            else:
+                                track = lambda done, total: progress_bar.progress(done / total, text=f"Scoring messages... {done:,}/{total:,}")
+                            if progressive and sentiment.cached_scores(chat) is None:
+                                later(schedule(charts.chart_png, 'sentiment_preview', selected_user, chat),
+                                      sentiment_slot, show_preview)
+                            later(schedule(sentiment.analyze_sentiment, chat, selected_user, progress=track),
+                                  sentiment_slot, show_sentiment)
+
+                    # Fill the slow sections in as they finish
+                    while deferred:
+                        done, _ = wait(list(deferred), timeout=0.2, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            for fill in deferred.pop(future):
+                                fill(future.result())
+                        if scoring.get('total') and 'sentiment' not in shown:
+                            progress_bar.progress(scoring['done'] / scoring['total'],
+                                                  text=f"Scoring messages... {scoring['done']:,}/{scoring['total']:,}")
 
                     st.success("Analysis completed successfully!")
                     
@@ -281,6 +385,26 @@ if uploaded_file is not None:
                     st.error(f"Error during analysis: {str(e)}")
                     st.info("Please try again with a different chat file")
 
+        with st.expander("Performance"):
+            stages = profiling.summary()
+            if stages.empty:
+                st.caption("Nothing has been timed yet.")
+            else:
+                st.caption("Time spent in each pipeline stage since the server started (cached results are not re-timed).")
+                if profiling.memory_tracking():
+                    st.caption("Peak memory is only measured for stages that ran on their own; "
+                               "stages overlapping others (charts, progressive mode) show '-'.")
+                st.dataframe(stages.style.format({
+                    'total_seconds': '{:.3f}', 'mean_seconds': '{:.4f}', 'max_seconds': '{:.4f}',
+                    'rows': '{:,.0f}', 'rows_per_second': '{:,.0f}', 'peak_mb': '{:.1f}',
+                }, na_rep='-'), use_container_width=True)
+                st.download_button(
+                    "Download timings (JSON)",
+                    data=json.dumps(profiling.report(), indent=2, default=str),
+                    file_name="timings.json",
+                    mime="application/json",
+                )
+
     except Exception as e:
         st.error(f"Error processing file: {str(e)}")
         st.info("Please make sure you're uploading a valid WhatsApp chat export file")
@@ -0,0 +1,329 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import pandas as pd
+import preprocessor
+import helper
+import pools
+import profiling
+from chat_index import ChatIndex
+
+# Headless entry point: analyse many exported chats without Streamlit.
+#
+#   python batch.py exports/ -o results/ --jobs 4 --charts
+#
+# Every chat gets its own directory with summary.json, the aggregate tables
+# as Parquet and, with --charts, the same charts the app draws as PNGs.
+
+TOP_N = 20
+
+
+def find_exports(inputs):
+    # Directories are searched recursively for .txt files; anything else is
+    # taken as a path or glob pattern
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(Path(item).rglob('*.txt')))
+        else:
+            paths.extend(Path(p) for p in sorted(glob.glob(item, recursive=True)))
+
+    seen = set()
+    unique = []
+    for path in paths:
+        resolved = path.resolve()
+        if path.is_file() and resolved not in seen:
+            seen.add(resolved)
+            unique.append(path)
+    return unique
+
+
+def _output_names(paths):
+    # One output directory per export, named after the file; exports with the
+    # same name in different folders get a numeric suffix
+    names = []
+    used = {}
+    for path in paths:
+        stem = path.stem
+        used[stem] = used.get(stem, 0) + 1
+        names.append(stem if used[stem] == 1 else f"{stem}-{used[stem]}")
+    return names
+
+
+def _init_worker():
+    # Chats are already spread over the pool; stop the per-chat steps from
+    # starting process pools of their own inside every worker
+    pools.PARALLEL_MIN_MESSAGES = float('inf')
+    import charts
+    charts.DRAW_PROCESSES = 0
+
+
+def _write_table(table, path):
+    if isinstance(table, pd.Series):
+        table = table.reset_index()
+    table = table.copy()
+    table.columns = [str(c) for c in table.columns]
+    table.to_parquet(path, index=False)
+
+
+# chart -> file name in the output directory
+CHART_FILES = {
+    'timeline': 'monthly_timeline.png',
+    'daily_timeline': 'daily_timeline.png',
+    'week_activity': 'week_activity.png',
+    'month_activity': 'month_activity.png',
+    'busy_users': 'busy_users.png',
+    'activity_heatmap': 'activity_heatmap.png',
+    'common_words': 'common_words.png',
+    'wordcloud': 'wordcloud.png',
+}
+
+
+def _write_charts(chat, out_dir):
+    # Missing emoji glyphs in the default font are not worth a warning per chart
+    warnings.filterwarnings('ignore', category=UserWarning)
+    import charts
+
+    pngs = charts.render_all(list(CHART_FILES), 'Overall', chat)
+    for chart, png in pngs.items():
+        if png:
+            (out_dir / CHART_FILES[chart]).write_bytes(png)
+
+
+def analyse_chat(path, out_dir, charts=False, with_sentiment=True, use_cache=True, profile=False, store_dir=None):
+    # Runs the full analysis for one export and writes its results. Returns a
+    # record with sizes and per-step timings; failures are reported in it
+    # rather than raised so one bad export does not stop the batch. With
+    # `profile` the per-stage timings also go to profile.json. With
+    # `store_dir` the chat is also added to that multi-chat store.
+    timings = {}
+    record = {'path': str(path), 'output': str(out_dir), 'bytes': os.path.getsize(path)}
+    started = time.perf_counter()
+    if profile:
+        profiling.reset()
+    try:
+        step = time.perf_counter()
+        with open(path, 'rb') as f:
+            if use_cache:
+                import incremental
+                chat = incremental.ingest(f)
+            else:
+                df = preprocessor.preprocess_stream(f)
+                chat = ChatIndex(df) if not df.empty else None
+        timings['parse'] = time.perf_counter() - step
+        if chat is None:
+            raise ValueError("no messages could be extracted")
+        record['messages'] = len(chat)
+
+        step = time.perf_counter()
+        users = [u for u in chat.users.tolist() if u != 'group_notification']
+        user_stats = pd.DataFrame(
+            [helper.fetch_stats(u, chat) for u in ['Overall'] + users],
+            index=pd.Index(['Overall'] + users, name='user'),
+            columns=['messages', 'words', 'media', 'links']
+        )
+        busy_users, busy_percent = helper.most_busy_users(chat)
+        common_words = helper.most_common_words('Overall', chat)
+        if not common_words.empty:
+            common_words.columns = ['word', 'count']
+        tables = {
+            'user_stats': user_stats,
+            'busy_users': busy_users,
+            'busy_percent': busy_percent,
+            'monthly_timeline': helper.monthly_timeline('Overall', chat),
+            'daily_timeline': helper.daily_timeline('Overall', chat),
+            'week_activity': helper.week_activity_map('Overall', chat),
+            'month_activity': helper.month_activity_map('Overall', chat),
+            'activity_heatmap': helper.activity_heatmap('Overall', chat),
+            'common_words': common_words,
+            'emojis': helper.emoji_helper('Overall', chat),
+        }
+        timings['analyse'] = time.perf_counter() - step
+
+        sentiment_counts = None
+        if with_sentiment:
+            step = time.perf_counter()
+            import sentiment
+            df_sentiment, counts = sentiment.analyze_sentiment(chat)
+            if 'sentiment' in df_sentiment.columns:
+                tables['sentiment_by_user'] = (
+                    df_sentiment.groupby('user', observed=True)['sentiment'].value_counts().unstack(fill_value=0)
+                )
+                sentiment_counts = dict(zip(counts['Sentiment'], counts['Count'].astype(int).tolist()))
+            timings['sentiment'] = time.perf_counter() - step
+
+        step = time.perf_counter()
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name, table in tables.items():
+            if table is not None and len(table) > 0:
+                _write_table(table, out_dir / f"{name}.parquet")
+
+        overall = user_stats.loc['Overall']
+        summary = {
+            'source': str(path),
+            'messages': int(overall['messages']),
+            'words': int(overall['words']),
+            'media': int(overall['media']),
+            'links': int(overall['links']),
+            'users': len(users),
+            'first_message': str(chat.df['message_date'].min()),
+            'last_message': str(chat.df['message_date'].max()),
+            'date_format': chat.df.attrs.get('date_format'),
+            'top_users': {str(k): int(v) for k, v in busy_users.items()},
+            'top_words': dict(zip(common_words['word'], common_words['count'].astype(int).tolist())) if not common_words.empty else {},
+            'top_emojis': dict(zip(tables['emojis']['Emoji'].head(TOP_N), tables['emojis']['Count'].head(TOP_N).astype(int).tolist())),
+            'sentiment': sentiment_counts,
+        }
+        with open(out_dir / 'summary.json', 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        timings['write'] = time.perf_counter() - step
+
+        if charts:
+            step = time.perf_counter()
+            _write_charts(chat, out_dir)
+            timings['charts'] = time.perf_counter() - step
+
+        if store_dir is not None:
+            step = time.perf_counter()
+            import store
+            record['chat_id'] = store.add_chat(chat, chat_id=out_dir.name, name=Path(path).stem, root=store_dir)
+            timings['store'] = time.perf_counter() - step
+
+        record['status'] = 'ok'
+    except Exception as e:
+        print(f"Error in analyse_chat ({path}): {e}")
+        record['status'] = 'error'
+        record['error'] = str(e)
+
+    timings['total'] = time.perf_counter() - started
+    record['timings'] = {k: round(v, 4) for k, v in timings.items()}
+    if profile:
+        report = profiling.report()
+        record['stages'] = report['stages']
+        if record['status'] == 'ok':
+            with open(out_dir / 'profile.json', 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, default=str)
+    return record
+
+
+def run(paths, out_dir, jobs=None, charts=False, with_sentiment=True, use_cache=True, profile=False, store_dir=None):
+    # Analyses every export, at most `jobs` at a time, and returns the
+    # per-chat records plus a throughput summary
+    out_dir = Path(out_dir)
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(paths) or 1))
+    targets = [out_dir / name for name in _output_names(paths)]
+
+    started = time.perf_counter()
+    records = []
+    if jobs == 1:
+        for path, target in zip(paths, targets):
+            records.append(analyse_chat(path, target, charts, with_sentiment, use_cache, profile, store_dir))
+            _report(records[-1], len(records), len(paths))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+            futures = [
+                pool.submit(analyse_chat, path, target, charts, with_sentiment, use_cache, profile, store_dir)
+                for path, target in zip(paths, targets)
+            ]
+            for future in as_completed(futures):
+                records.append(future.result())
+                _report(records[-1], len(records), len(paths))
+    elapsed = time.perf_counter() - started
+
+    records.sort(key=lambda r: r['path'])
+    done = [r for r in records if r['status'] == 'ok']
+    messages = sum(r.get('messages', 0) for r in done)
+    size = sum(r['bytes'] for r in done)
+    summary = {
+        'chats': len(records),
+        'succeeded': len(done),
+        'failed': len(records) - len(done),
+        'jobs': jobs,
+        'messages': messages,
+        'bytes': size,
+        'seconds': round(elapsed, 3),
+        'chats_per_second': round(len(done) / elapsed, 3) if elapsed else None,
+        'messages_per_second': round(messages / elapsed, 1) if elapsed else None,
+        'megabytes_per_second': round(size / 1e6 / elapsed, 3) if elapsed else None,
+    }
+    return records, summary
+
+
+def _report(record, done, total):
+    timings = ', '.join(f"{k} {v:.2f}s" for k, v in record['timings'].items())
+    if record['status'] == 'ok':
+        print(f"[{done}/{total}] {record['path']}: {record['messages']:,} messages ({timings})")
+    else:
+        print(f"[{done}/{total}] {record['path']}: failed - {record['error']} ({timings})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse WhatsApp chat exports without the web app.")
+    parser.add_argument('inputs', nargs='*', help="export files, directories or glob patterns")
+    parser.add_argument('-o', '--output', default='analysis', help="directory for the results (default: analysis)")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="chats analysed in parallel (default: CPU count)")
+    parser.add_argument('--charts', action='store_true', help="also render the charts as PNG files")
+    parser.add_argument('--no-sentiment', action='store_true', help="skip sentiment analysis")
+    parser.add_argument('--no-cache', action='store_true', help="always parse from scratch, bypassing the chat cache")
+    parser.add_argument('--profile', action='store_true',
+                        help="write per-stage timings to profile.json for every chat "
+                             "(set CHAT_PROFILE_MEMORY=1 to include peak memory)")
+    parser.add_argument('--store', metavar='DIR', default=None,
+                        help="also add every chat to the multi-chat store in DIR (see store.py)")
+    parser.add_argument('--remove', metavar='CHAT_ID', action='append', default=[],
+                        help="remove a chat from the --store DIR first (repeatable); inputs are then optional")
+    args = parser.parse_args(argv)
+
+    if args.remove:
+        if args.store is None:
+            parser.error("--remove needs --store DIR")
+        import store
+        for chat_id in args.remove:
+            if store.remove_chat(chat_id, root=args.store):
+                print(f"Removed {chat_id} from {args.store}")
+            else:
+                print(f"No chat {chat_id} in {args.store}")
+        if not args.inputs:
+            return 0
+    elif not args.inputs:
+        parser.error("no inputs given")
+
+    paths = find_exports(args.inputs)
+    if not paths:
+        print("No chat exports found.")
+        return 1
+
+    if not args.no_cache:
+        # The batch runner is local, so it keeps parsed chats on disk for the
+        # next run; workers inherit the setting through the environment
+        import cache
+        os.environ['CHAT_DISK_CACHE'] = '1'
+        cache.ENABLED = True
+
+    records, summary = run(
+        paths, args.output, jobs=args.jobs, charts=args.charts,
+        with_sentiment=not args.no_sentiment, use_cache=not args.no_cache, profile=args.profile,
+        store_dir=args.store
+    )
+
+    out_dir = Path(args.output)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / 'run.json', 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, 'chats': records}, f, indent=2)
+
+    print(
+        f"{summary['succeeded']}/{summary['chats']} chats, {summary['messages']:,} messages in "
+        f"{summary['seconds']:.2f}s with {summary['jobs']} jobs: "
+        f"{summary['messages_per_second']:,.0f} messages/s, {summary['megabytes_per_second']:.2f} MB/s"
+    )
+    return 0 if summary['failed'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
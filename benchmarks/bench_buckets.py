@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import helper
+from chat_index import ChatIndex
+from bench_timeline import synthetic_frame, legacy_frame
+
+
+def legacy_heatmap(df):
+    # The old activity_heatmap: copy the frame, add a period column, pivot
+    df_copy = df.copy()
+    df_copy['hour'] = df_copy['message_date'].dt.hour
+    df_copy['period'] = df_copy['hour']
+    return df_copy.pivot_table(index='day_name', columns='period', values='message', aggfunc='count').fillna(0)
+
+
+def timed(func, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(n=1_000_000):
+    df = synthetic_frame(n)
+    legacy = legacy_frame(df)
+
+    # Same counts as the pivot, with weekdays in calendar order
+    chat = ChatIndex(df)
+    heatmap = helper.activity_heatmap.uncached('Overall', chat)
+    expected = legacy_heatmap(legacy)
+    assert list(heatmap.index) == ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    assert np.array_equal(heatmap.sort_index().to_numpy(), expected.sort_index().to_numpy())
+
+    # Shifting zones moves every message by the offset (no DST in either)
+    shifted = chat.bucket_matrix('weekday', 'slot15', tz='Asia/Kolkata', source_tz='UTC')
+    assert shifted.to_numpy().sum() == len(df)
+    assert np.array_equal(chat.minutes('Asia/Kolkata', 'UTC') - chat.minutes(), np.full(len(df), 330))
+
+    print(f"messages: {len(df):,}")
+    print(f"copy + pivot_table heatmap:        {timed(lambda: legacy_heatmap(legacy), 1) * 1000:8.1f} ms")
+
+    cold = timed(lambda: ChatIndex(df).bucket_matrix('weekday', 'hour'), 1)
+    print(f"weekday x hour, first call:        {cold * 1000:8.1f} ms (computes the bucket codes)")
+    cases = [
+        ('weekday x hour', lambda: chat.bucket_matrix('weekday', 'hour')),
+        ('weekday x 15 minutes', lambda: chat.bucket_matrix('weekday', 'slot15')),
+        ('ISO week x weekday', lambda: chat.bucket_matrix('week', 'weekday')),
+        ('quarter timeline', lambda: chat.bucket_counts('quarter')),
+        ('one member, weekday x hour', lambda: chat.bucket_matrix('weekday', 'hour', chat.users[0])),
+        ('weekday x hour, shifted zone', lambda: chat.bucket_matrix('weekday', 'hour', tz='Asia/Kolkata', source_tz='UTC')),
+    ]
+    for name, func in cases:
+        func()
+        print(f"{name + ':':<35}{timed(func) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,92 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('CHAT_CACHE_DIR', tempfile.mkdtemp())
+import preprocessor
+import charts
+import cache
+import memo
+from chat_index import ChatIndex
+from synthetic import generate_export
+
+NAMES = ['timeline', 'daily_timeline', 'week_activity', 'month_activity', 'activity_heatmap',
+         'busy_users', 'common_words']
+
+
+def pyplot_pages(chat, pages):
+    # The app before: pyplot figures drawn one after another and never closed
+    for _ in range(pages):
+        for name in NAMES:
+            spec = charts.CHARTS[name]
+            fig, ax = plt.subplots(figsize=spec['size'])
+            fig.delaxes(ax)
+            spec['draw'](fig, spec['data']('Overall', chat, None, None, None))
+            fig.savefig(io.BytesIO(), format='png', dpi=charts.DPI, bbox_inches='tight')
+
+
+def main(n=100_000, pages=3):
+    warnings.filterwarnings('ignore', category=UserWarning)
+    # pyplot warns about the figures left open, which is the point here
+    warnings.filterwarnings('ignore', category=RuntimeWarning)
+    with contextlib.redirect_stdout(io.StringIO()):
+        chat = ChatIndex(preprocessor.preprocess(generate_export(n)))
+    # Aggregates first, so only drawing is timed
+    for name in NAMES:
+        charts.CHARTS[name]['data']('Overall', chat, None, None, None)
+
+    start = time.perf_counter()
+    pyplot_pages(chat, pages)
+    before = (time.perf_counter() - start) / pages
+    print(f"pyplot, one at a time:          {before:6.2f}s per page, {len(plt.get_fignums())} figures left open")
+    plt.close('all')
+
+    def cold(processes):
+        # No PNGs cached, so every chart is drawn
+        charts.DRAW_PROCESSES = processes
+        memo.clear()
+        cache.evict(0)
+        start = time.perf_counter()
+        pngs = charts.render_all(NAMES, 'Overall', chat)
+        return pngs, time.perf_counter() - start
+
+    first, inline = cold(0)
+    print(f"Figure API, drawn in threads:   {inline:6.2f}s per page")
+    slowest = 0
+    for name in NAMES:
+        start = time.perf_counter()
+        charts._draw(name, charts.CHARTS[name]['data']('Overall', chat, None, None, None))
+        slowest = max(slowest, time.perf_counter() - start)
+    print(f"slowest single chart:           {slowest:6.2f}s")
+
+    # The pool's processes are spawned once per server; start them first
+    workers = charts.MAX_WORKERS
+    charts.DRAW_PROCESSES = workers
+    list(charts._draw_pool().map(int, range(workers)))
+    pooled, seconds = cold(workers)
+    print(f"drawn in {workers} processes:           {seconds:6.2f}s per page ({os.cpu_count()} CPUs)")
+    assert pooled.keys() == first.keys() and all((pooled[n] is None) == (first[n] is None) for n in NAMES)
+
+    memo.clear()
+    start = time.perf_counter()
+    again = charts.render_all(NAMES, 'Overall', chat)
+    print(f"rerun, PNGs from disk:          {(time.perf_counter() - start) * 1000:6.1f}ms")
+    assert again == first
+
+    start = time.perf_counter()
+    charts.render_all(NAMES, 'Overall', chat)
+    print(f"rerun, PNGs from memory:        {(time.perf_counter() - start) * 1000:6.1f}ms")
+    assert cache.cache_stats()['entries'] >= len(NAMES)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,56 @@
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import emoji
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import emojis
+
+def synthetic_messages(n, emoji_rate, seed=0):
+    rng = random.Random(seed)
+    pool = list(emoji.EMOJI_DATA)
+    words = ['hello', 'ok', 'haha', 'kal', 'milte', 'hai', 'yaar', '10:30', '#1']
+    return pd.Series([
+        ' '.join(rng.choice(pool) if rng.random() < emoji_rate else rng.choice(words) for _ in range(8))
+        for _ in range(n)
+    ])
+
+
+def count_loop(messages):
+    found = []
+    for message in messages:
+        if isinstance(message, str):
+            found.extend([c for c in message if c in emoji.EMOJI_DATA])
+    return Counter(found)
+
+
+def main(n=1_000_000):
+    # Correctness is covered by tests/test_emojis.py
+    for emoji_rate in (0.02, 0.005):
+        messages = synthetic_messages(n, emoji_rate)
+        users = pd.Series(random.Random(1).choices('ABCDEFGH', k=n))
+
+        start = time.perf_counter()
+        count_loop(messages)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        emojis.count_emojis(messages)
+        new_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        emojis.count_emojis(messages, users)
+        per_user_time = time.perf_counter() - start
+
+        print(f"{n:,} messages, {emoji_rate:.1%} emoji tokens")
+        print(f"  per-character loop: {loop_time:.2f}s")
+        print(f"  count_emojis:       {new_time:.2f}s ({loop_time / new_time:.1f}x)")
+        print(f"  with per-user:      {per_user_time:.2f}s")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
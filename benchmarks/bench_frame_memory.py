@@ -0,0 +1,89 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('CHAT_CACHE_DIR', tempfile.mkdtemp())
+import preprocessor
+import helper
+from chat_index import ChatIndex
+from synthetic import generate_export
+
+
+def legacy_layout(df):
+    # The frame as preprocess() used to build it: date objects, strftime
+    # strings, int64 parts and object columns
+    legacy = pd.DataFrame({'message_date': df['message_date']})
+    dates = legacy['message_date'].dt
+    legacy['only_date'] = dates.date
+    legacy['year'] = dates.year
+    legacy['month'] = dates.strftime('%B')
+    legacy['day'] = dates.day
+    legacy['hour'] = dates.hour
+    legacy['minute'] = dates.minute
+    legacy['day_name'] = dates.day_name()
+    legacy['user'] = df['user'].astype(object)
+    legacy['message'] = df['message'].astype(object)
+    return legacy
+
+
+def normalized(result):
+    # Row order and dtypes differ between the layouts (months now sort by
+    # calendar, days are timestamps); the content must not
+    if isinstance(result, pd.Series):
+        result = result.reset_index()
+    result = result.reset_index(drop=True).copy()
+    for column in result.columns:
+        if isinstance(result[column].dtype, pd.CategoricalDtype) or result[column].dtype == 'string':
+            result[column] = result[column].astype(object)
+        elif result[column].dtype.kind in 'iu':
+            result[column] = result[column].astype('int64')
+        elif result[column].dtype == object and len(result) and hasattr(result[column].iloc[0], 'isoformat'):
+            result[column] = pd.to_datetime(result[column])
+    result.columns = [str(c) for c in result.columns]
+    return result.sort_values(list(result.columns)).reset_index(drop=True)
+
+
+def check_helpers(compact, legacy):
+    new = ChatIndex(compact)
+    old = ChatIndex(legacy)
+    for user in ['Overall'] + new.users.tolist()[:3]:
+        for name in ['monthly_timeline', 'daily_timeline', 'week_activity_map', 'month_activity_map',
+                     'most_common_words', 'emoji_helper']:
+            func = getattr(helper, name).uncached
+            pd.testing.assert_frame_equal(normalized(func(user, new)), normalized(func(user, old)))
+        heatmaps = [helper.activity_heatmap.uncached(user, chat) for chat in (new, old)]
+        pd.testing.assert_frame_equal(heatmaps[0], heatmaps[1])
+        assert helper.fetch_stats.uncached(user, new) == helper.fetch_stats.uncached(user, old)
+
+
+def report(before, after):
+    before = before.memory_usage(deep=True, index=False)
+    after = after.memory_usage(deep=True, index=False)
+    print(f"{'column':<14}{'before':>12}{'after':>12}")
+    for column in before.index:
+        print(f"{column:<14}{before[column] / 1e6:>10.1f}MB{after[column] / 1e6:>10.1f}MB")
+    print(f"{'total':<14}{before.sum() / 1e6:>10.1f}MB{after.sum() / 1e6:>10.1f}MB  ({before.sum() / after.sum():.1f}x smaller)")
+
+
+def main(n=1_000_000):
+    text = generate_export(n)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        compact = preprocessor.preprocess(text)
+        parse_time = time.perf_counter() - start
+    legacy = legacy_layout(compact)
+
+    check_helpers(compact.head(50_000), legacy.head(50_000))
+
+    print(f"messages: {n:,} (parsed in {parse_time:.2f}s)")
+    report(legacy, compact)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,75 @@
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import links
+
+# Messages whose link counts must not change, whatever the engine does
+GOLDEN = [
+    'check https://example.com and www.test.org',
+    'mail me at someone@gmail.com',
+    'server on http://localhost:8501 is up',
+    'LOCALHOST:3000 works',
+    'ip 192.168.1.1 is the router',
+    'ok.',
+    'see you at 10.30',
+    'github.com/streamlit/streamlit/issues?q=cache',
+    'two links: a.in b.co.uk',
+    'no link here',
+    '<Media omitted>',
+    'haha...',
+    'version 1.2.3',
+    'wiki: https://en.wikipedia.org/wiki/WhatsApp#History',
+    '',
+]
+
+
+def synthetic_messages(n, seed=0):
+    rng = random.Random(seed)
+    words = ['hello', 'ok', 'haha', 'kal', 'milte', 'hai', 'yaar', 'done.', 'meeting', 'at', '5']
+    rows = []
+    for _ in range(n):
+        if rng.random() < 0.03:
+            rows.append(rng.choice(GOLDEN))
+        else:
+            rows.append(' '.join(rng.choice(words) for _ in range(rng.randint(1, 12))))
+    return pd.Series(rows)
+
+
+def count_loop(messages):
+    extract = links.get_extractor()
+    return [len(extract.find_urls(m)) if isinstance(m, str) else 0 for m in messages]
+
+
+def main(n=100_000):
+    golden = pd.Series(GOLDEN + [None])
+    assert count_loop(golden) == links.count_links(golden, processes=1).tolist()
+
+    messages = synthetic_messages(n)
+
+    start = time.perf_counter()
+    expected = count_loop(messages)
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    serial = links.count_links(messages, processes=1)
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = links.count_links(messages)
+    parallel_time = time.perf_counter() - start
+
+    assert expected == serial.tolist() == parallel.tolist()
+
+    print(f"messages:      {n:,} ({sum(expected):,} links)")
+    print(f"find_urls loop: {loop_time:.2f}s")
+    print(f"prefiltered:    {serial_time:.2f}s ({loop_time / serial_time:.1f}x)")
+    print(f"parallel:       {parallel_time:.2f}s ({loop_time / parallel_time:.1f}x, {os.cpu_count()} cpus)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,66 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('CHAT_CACHE_DIR', tempfile.mkdtemp())
+import preprocessor
+import helper
+import memo
+from chat_index import ChatIndex
+from synthetic import generate_export
+
+
+def view(user, chat):
+    # Everything the app computes for one selected user
+    helper.fetch_stats(user, chat)
+    helper.monthly_timeline(user, chat)
+    helper.daily_timeline(user, chat)
+    helper.week_activity_map(user, chat)
+    helper.month_activity_map(user, chat)
+    helper.activity_heatmap(user, chat)
+    helper.most_common_words(user, chat)
+    helper.emoji_helper(user, chat)
+    if user == 'Overall':
+        helper.most_busy_users(chat)
+
+
+def main(n=50_000, users=50):
+    with contextlib.redirect_stdout(io.StringIO()):
+        chat = ChatIndex(preprocessor.preprocess(generate_export(n, users=users)))
+    members = ['Overall'] + chat.users.tolist()
+
+    # Correctness: memoized results equal direct calls and are not shared
+    for user in members[:3]:
+        pd.testing.assert_frame_equal(helper.monthly_timeline(user, chat), helper.monthly_timeline.uncached(user, chat))
+        pd.testing.assert_frame_equal(helper.activity_heatmap(user, chat), helper.activity_heatmap.uncached(user, chat))
+    first = helper.most_common_words('Overall', chat)
+    first.columns = ['a', 'b']
+    assert list(helper.most_common_words('Overall', chat).columns) == [0, 1]
+    memo.clear()
+
+    start = time.perf_counter()
+    for user in members:
+        view(user, chat)
+    first_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(5):
+        for user in members:
+            view(user, chat)
+    repeat_time = (time.perf_counter() - start) / 5
+
+    stats = memo.memo_stats()
+    print(f"messages: {n:,}, users: {len(members) - 1}")
+    print(f"first view of every user:  {first_time * 1000:8.1f} ms ({first_time / len(members) * 1000:.2f} ms per user)")
+    print(f"switching back to them:    {repeat_time * 1000:8.1f} ms ({repeat_time / len(members) * 1000:.3f} ms per user, {first_time / repeat_time:.0f}x)")
+    print(f"memo entries: {stats['entries']}, ~{stats['bytes'] / 1024:.0f} KiB")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,56 @@
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sentiment
+
+REPEATS = ['ok', 'haha', 'Okk', 'good night', 'hmm', 'lol', 'thanks!', '<Media omitted>', 'This message was deleted']
+WORDS = ['great', 'bad', 'kal', 'milte', 'hai', 'yaar', 'love', 'hate', 'exam', 'party', 'tired', 'awesome']
+
+
+def synthetic_chat(n, repeat_ratio=0.5, seed=0):
+    rng = random.Random(seed)
+    users = []
+    messages = []
+    for _ in range(n):
+        if rng.random() < 0.03:
+            users.append('group_notification')
+            messages.append('Rahul added Priya')
+        else:
+            users.append(rng.choice(['Aayush', 'Rahul', 'Priya', 'Dev']))
+            if rng.random() < repeat_ratio:
+                messages.append(rng.choice(REPEATS))
+            else:
+                messages.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 12))))
+    return pd.Series(users), pd.Series(messages)
+
+
+def main(n=100_000):
+    users, messages = synthetic_chat(n)
+    skip = (users == 'group_notification') | messages.str.contains('<Media omitted>', regex=False)
+    unique_ratio = messages[~skip].nunique() / n
+
+    sia = sentiment.get_analyzer()
+    start = time.perf_counter()
+    per_row = messages.apply(lambda text: sia.polarity_scores(text)['compound']).to_numpy()
+    per_row_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    deduplicated = sentiment.score_messages(messages, processes=1, skip=skip)
+    dedup_time = time.perf_counter() - start
+
+    assert np.array_equal(per_row[~skip.to_numpy()], deduplicated[~skip.to_numpy()])
+
+    print(f"messages:          {n:,}")
+    print(f"texts to score:    {unique_ratio:.1%} of rows")
+    print(f"per-row apply:     {per_row_time:.2f}s")
+    print(f"deduplicated:      {dedup_time:.2f}s ({per_row_time / dedup_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,86 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Each snippet runs in a fresh interpreter and prints one or more timings
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import preprocessor, helper, sentiment, links, chat_index
+imported = time.perf_counter()
+sentiment.get_analyzer()
+analyzer = time.perf_counter()
+links.get_extractor()
+extractor = time.perf_counter()
+print(imported - start, analyzer - imported, extractor - analyzer)
+"""
+
+APP_SNIPPET = """
+import time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file('app.py', default_timeout=120)
+start = time.perf_counter()
+at.run()
+cold = time.perf_counter() - start
+warm = []
+for _ in range(RERUNS):
+    start = time.perf_counter()
+    at.run()
+    warm.append(time.perf_counter() - start)
+print(cold, *warm)
+"""
+
+DOWNLOAD_SNIPPET = """
+import time
+start = time.perf_counter()
+import nltk
+imported = time.perf_counter()
+nltk.download('vader_lexicon', quiet=True)
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def run_snippet(code, timeout=300):
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed')
+    return [float(x) for x in result.stdout.strip().splitlines()[-1].split()]
+
+
+def main(repeats=5):
+    imports = [run_snippet(IMPORT_SNIPPET) for _ in range(repeats)]
+    import_time, analyzer_time, extractor_time = (statistics.median(col) for col in zip(*imports))
+
+    print(f"cold import of the analysis modules: {import_time * 1000:7.1f} ms (median of {repeats})")
+    print(f"first VADER use (nltk + lexicon):    {analyzer_time * 1000:7.1f} ms, paid once per process")
+    print(f"first URLExtract use (TLD list):     {extractor_time * 1000:7.1f} ms, paid once per process")
+
+    try:
+        timings = run_snippet(APP_SNIPPET.replace('RERUNS', str(repeats)))
+        cold, warm = timings[0], timings[1:]
+        print(f"app script, first run:               {cold * 1000:7.1f} ms")
+        print(f"app script, warm rerun:              {statistics.median(warm) * 1000:7.1f} ms (median of {repeats})")
+    except Exception as e:
+        print(f"app script timing skipped: {e}")
+
+    # What every rerun used to pay before the app stopped calling
+    # nltk.download at the top of the script
+    try:
+        started = time.perf_counter()
+        nltk_import, download = run_snippet(DOWNLOAD_SNIPPET, timeout=120)
+        print(f"old per-rerun nltk.download check:   {download * 1000:7.1f} ms (plus {nltk_import * 1000:.1f} ms nltk import on a cold start)")
+    except subprocess.TimeoutExpired:
+        print(f"old per-rerun nltk.download check:   did not finish within {time.perf_counter() - started:.0f}s")
+    except Exception as e:
+        print(f"old per-rerun nltk.download check skipped: {e}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
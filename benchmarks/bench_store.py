@@ -0,0 +1,74 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('CHAT_CACHE_DIR', tempfile.mkdtemp())
+import preprocessor
+import helper
+import store
+from chat_index import ChatIndex
+from synthetic import generate_export
+from suite import _reset_peak_rss, _rss_mb
+
+
+def load_everything(root):
+    # The naive cross-chat query: read every stored column of every chat
+    return pd.read_parquet(os.path.join(root, 'messages'))
+
+
+def timed(func):
+    # Seconds and how far the process peak RSS rose above the current RSS
+    pa.default_memory_pool().release_unused()
+    before = _rss_mb('VmRSS')
+    _reset_peak_rss()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    return result, elapsed, _rss_mb() - before
+
+
+def main(chats=20, n=50_000):
+    root = tempfile.mkdtemp()
+    indexes = {}
+    start = time.perf_counter()
+    for i in range(chats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            chat = ChatIndex(preprocessor.preprocess(generate_export(n, users=5 + i % 20, seed=i)))
+        indexes[store.add_chat(chat, name=f'group {i:02d}', root=root)] = chat
+    print(f"stored {chats} chats x {n:,} messages in {time.perf_counter() - start:.1f}s")
+
+    # Same answers as the single-chat helpers
+    first = next(iter(indexes))
+    member = indexes[first].users[2]
+    pd.testing.assert_frame_equal(
+        store.monthly_timeline([first], member, root=root),
+        helper.monthly_timeline.uncached(member, indexes[first]), check_dtype=False)
+    assert store.chat_stats([first], root=root).iloc[0].tolist() == list(helper.fetch_stats.uncached('Overall', indexes[first]))
+
+    print(f"{'':<42}{'time':>11}{'peak RSS growth':>18}")
+    queries = [
+        ('monthly timeline, all chats', lambda: store.monthly_timeline(by_chat=True, root=root)),
+        ('stats per chat', lambda: store.chat_stats(root=root)),
+        ('most busy users, all chats', lambda: store.most_busy_users(root=root)),
+        ('emoji, all chats', lambda: store.emoji_helper(root=root)),
+        ('one member across chats', lambda: store.monthly_timeline(None, member, root=root)),
+        ('three chats, one quarter', lambda: store.chat_stats(list(indexes)[:3], start='2022-01', end='2022-03', root=root)),
+    ]
+    for name, func in queries:
+        _, seconds, grown = timed(func)
+        print(f"{name + ':':<42}{seconds * 1000:8.1f} ms {grown:13.1f} MB")
+
+    # Last, so its memory does not hide the queries' peaks
+    _, seconds, grown = timed(lambda: load_everything(root))
+    print(f"{'read every column of every chat:':<42}{seconds * 1000:8.1f} ms {grown:13.1f} MB")
+
+
+if __name__ == '__main__':
+    main(*(int(x) for x in sys.argv[1:]))
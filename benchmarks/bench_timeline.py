@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import preprocessor
+import helper
+from chat_index import ChatIndex
+
+YEARS = 6
+
+
+def synthetic_frame(n, users=30, seed=0):
+    # Parsed-chat frame spread over several years, with quiet stretches so
+    # the timelines have gaps to fill
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2018-01-01').value
+    span = pd.Timedelta(days=365 * YEARS).value
+    stamps = np.sort(rng.integers(0, span, n))
+    stamps = stamps[(stamps % (span // 10)) > span // 60]
+    df = pd.DataFrame({'message_date': pd.to_datetime(start + stamps).floor('min')})
+    preprocessor.add_date_columns(df)
+    df['user'] = pd.Categorical.from_codes(rng.integers(0, users, len(df)), [f'Member {i:02d}' for i in range(users)])
+    df['message'] = 'hello'
+    return df
+
+
+def legacy_frame(df):
+    legacy = df[['message_date', 'user', 'message']].astype({'user': object, 'message': object})
+    dates = legacy['message_date'].dt
+    legacy['only_date'] = dates.date
+    legacy['year'] = dates.year
+    legacy['month'] = dates.strftime('%B')
+    legacy['day_name'] = dates.day_name()
+    return legacy
+
+
+def legacy_calendar(df):
+    # The helpers before: count() over every column, a row-wise apply for the
+    # label and alphabetical month order
+    timeline = df.groupby(['year', 'month']).count()['message'].reset_index()
+    timeline['time'] = timeline.apply(lambda row: f"{row['month']}-{row['year']}", axis=1)
+    daily = df.groupby('only_date').count()['message'].reset_index()
+    return timeline, daily, df['day_name'].value_counts(), df['month'].value_counts()
+
+
+def calendar(df):
+    chat = ChatIndex(df)
+    return (
+        helper.monthly_timeline.uncached('Overall', chat),
+        helper.daily_timeline.uncached('Overall', chat),
+        helper.week_activity_map.uncached('Overall', chat),
+        helper.month_activity_map.uncached('Overall', chat),
+    )
+
+
+def check(df):
+    new = calendar(df)
+    old = legacy_calendar(legacy_frame(df))
+
+    months = new[0]
+    periods = pd.PeriodIndex.from_fields(year=months['year'], month=months['month'].cat.codes + 1, freq='M')
+    assert (np.diff(periods.asi8) == 1).all(), "months are not consecutive"
+    assert (months['message'] == 0).any(), "expected gaps in the synthetic chat"
+    old_months = old[0].set_index('time')['message']
+    assert months[months['message'] > 0].set_index('time')['message'].sort_index().equals(old_months.sort_index())
+
+    days = new[1]
+    assert (days['only_date'].diff().dropna() == pd.Timedelta(days=1)).all()
+    old_days = old[1].set_index(pd.to_datetime(old[1]['only_date']))['message']
+    assert days[days['message'] > 0].set_index('only_date')['message'].rename(None).equals(old_days.rename(None).rename_axis('only_date'))
+
+    # Every weekday and month, in calendar order, quiet ones as zeros
+    assert list(new[2].index.astype(str)) == preprocessor.DAY_NAMES
+    assert list(new[3].index.astype(str)) == preprocessor.MONTH_NAMES
+    assert {k: v for k, v in zip(new[2].index.astype(str), new[2]) if v} == old[2].to_dict()
+    assert {k: v for k, v in zip(new[3].index.astype(str), new[3]) if v} == old[3].to_dict()
+
+
+def timed(func, df, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(df)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes=(250_000, 500_000, 1_000_000, 2_000_000)):
+    check(synthetic_frame(200_000))
+
+    print(f"{'messages':>10}{'before':>10}{'after':>10}{'after per 1M':>14}")
+    for n in sizes:
+        df = synthetic_frame(n)
+        before = timed(legacy_calendar, legacy_frame(df), repeats=1)
+        after = timed(calendar, df)
+        print(f"{len(df):>10,}{before:>9.2f}s{after:>9.3f}s{after / len(df) * 1e6:>13.3f}s")
+
+
+if __name__ == '__main__':
+    main(tuple(int(x) for x in sys.argv[1:]) or (250_000, 500_000, 1_000_000, 2_000_000))
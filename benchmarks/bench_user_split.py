@@ -0,0 +1,61 @@
+import os
+import random
+import re
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import preprocessor
+
+
+def synthetic_user_messages(n, seed=0):
+    rng = random.Random(seed)
+    users = ['Aayush', 'Rahul Sharma', '+91 98765 43210', 'Priya', 'Dev']
+    words = ['hello', 'ok', 'haha', 'kal', 'milte', 'hai', 'yaar', 'at', '10:30', 'https://example.com']
+    rows = []
+    for _ in range(n):
+        if rng.random() < 0.05:
+            rows.append('Priya added Rahul Sharma')
+        else:
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 12)))
+            rows.append(f"{rng.choice(users)}: {text}")
+    return pd.Series(rows)
+
+
+def split_loop(user_message):
+    users = []
+    msgs = []
+    for message in user_message:
+        entry = re.split(r'([^:]+?):\s', message, maxsplit=1)
+        if len(entry) > 2:
+            users.append(entry[1].strip())
+            msgs.append(entry[2].strip())
+        else:
+            users.append('group_notification')
+            msgs.append(entry[0].strip())
+    return users, msgs
+
+
+def main(n=1_000_000):
+    user_message = synthetic_user_messages(n)
+
+    start = time.perf_counter()
+    old_users, old_msgs = split_loop(user_message)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_users, new_msgs = preprocessor.split_user_message(user_message)
+    new_time = time.perf_counter() - start
+
+    assert old_users == new_users and old_msgs == new_msgs
+
+    print(f"messages:   {n:,}")
+    print(f"loop:       {old_time:.2f}s ({n / old_time:,.0f} msg/s)")
+    print(f"new:        {new_time:.2f}s ({n / new_time:,.0f} msg/s)")
+    print(f"speedup:    {old_time / new_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
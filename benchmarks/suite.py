@@ -0,0 +1,280 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+# Benchmark harness for the analysis pipeline: times every public entry point
+# of preprocessor, chat_index, helper and sentiment on synthetic exports of
+# several sizes, records throughput and peak RSS, and compares the run with a
+# saved baseline.
+#
+#   python benchmarks/suite.py                                  # 10k, 100k, 1M, 5M
+#   python benchmarks/suite.py --sizes 10000 100000 --save-baseline
+#   python benchmarks/suite.py --sizes 100000 --skip sentiment --fail-on-regression
+#
+# Each size runs in a fresh process so peak memory of one size does not leak
+# into the next. Baselines are machine specific; save one before a change and
+# compare after it on the same machine.
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 5_000_000]
+DEFAULT_BASELINE = BENCH_DIR / 'baseline.json'
+# Slower than the baseline by more than this factor counts as a regression
+DEFAULT_TOLERANCE = 1.25
+# ...and by more than this many seconds, so timer noise on sub-millisecond
+# functions is not reported
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def _reset_peak_rss():
+    # Linux lets a process reset its high-water mark; elsewhere the peak is
+    # the process-wide maximum so far
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _rss_mb(field='VmHWM'):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def _fresh(chat, *names):
+    # Drops cached per-chat passes so the next access recomputes them
+    for name in names:
+        chat.__dict__.pop(name, None)
+
+
+def cases(path, chat):
+    # (name, function) pairs in pipeline order; `chat` is filled in by the
+    # parse case, so the later ones can use it
+    import preprocessor
+    import helper
+    import sentiment
+    from chat_index import ChatIndex
+
+    def parse():
+        with open(path, 'rb') as f, contextlib.redirect_stdout(io.StringIO()):
+            chat['df'] = preprocessor.preprocess_stream(f)
+
+    def index():
+        chat['index'] = ChatIndex(chat['df'])
+
+    def passes(*names):
+        def run():
+            _fresh(chat['index'], *names)
+            getattr(chat['index'], names[-1])
+        return run
+
+    def scores():
+        c = chat['index']
+        c.sentiment_scores = sentiment.score_messages(c.df['message'], skip=~c.text_mask)
+
+    def view(func, *args):
+        return lambda: func.uncached(*args[:1], chat['index'], *args[1:])
+
+    return [
+        ('preprocessor.preprocess_stream', parse),
+        ('chat_index.ChatIndex', index),
+        ('chat_index.media_mask', passes('media_mask')),
+        ('chat_index.link_counts', passes('link_counts')),
+        ('chat_index.term_counts', passes('_tokens', 'term_counts')),
+        ('chat_index.emoji_counts', passes('emoji_counts')),
+        ('helper.fetch_stats', view(helper.fetch_stats, 'Overall')),
+        ('helper.most_busy_users', lambda: helper.most_busy_users.uncached(chat['index'])),
+        ('helper.wordcloud_image', view(helper.wordcloud_image, 'Overall')),
+        ('helper.most_common_words', view(helper.most_common_words, 'Overall')),
+        ('helper.emoji_helper', view(helper.emoji_helper, 'Overall')),
+        ('helper.monthly_timeline', view(helper.monthly_timeline, 'Overall')),
+        ('helper.daily_timeline', view(helper.daily_timeline, 'Overall')),
+        ('helper.activity_timeline', view(helper.activity_timeline, 'Overall', 'week')),
+        ('helper.week_activity_map', view(helper.week_activity_map, 'Overall')),
+        ('helper.month_activity_map', view(helper.month_activity_map, 'Overall')),
+        ('helper.activity_heatmap', view(helper.activity_heatmap, 'Overall')),
+        ('sentiment.score_messages', scores),
+        ('sentiment.analyze_sentiment', lambda: sentiment.analyze_sentiment.uncached(chat['index'])),
+    ]
+
+
+def _selected(name, only, skip):
+    if only and not any(pattern in name for pattern in only):
+        return False
+    return not any(pattern in name for pattern in skip)
+
+
+def run_size(n, only=(), skip=(), repeats=None, seed=0):
+    # Runs in its own process: generates the export, then times each case
+    # (best of `repeats`) with the peak RSS it reached. The export and the
+    # chat cache both live in a temporary directory removed at the end.
+    repeats = repeats or (3 if n <= 100_000 else 1)
+    results = []
+    with tempfile.TemporaryDirectory(prefix='chat-bench-') as tmp:
+        os.environ['CHAT_CACHE_DIR'] = str(Path(tmp) / 'cache')
+        import cache
+        import synthetic
+
+        path = Path(tmp) / 'chat.txt'
+        start = time.perf_counter()
+        synthetic.write_export(path, n, seed=seed)
+        generated = time.perf_counter() - start
+
+        chat = {}
+        for name, func in cases(path, chat):
+            # Parsing and indexing feed the other cases, so they always run
+            needed = name in ('preprocessor.preprocess_stream', 'chat_index.ChatIndex')
+            if not needed and not _selected(name, only, skip):
+                continue
+            before = _rss_mb('VmRSS')
+            reset = _reset_peak_rss()
+            best = float('inf')
+            for _ in range(repeats):
+                # Link counts and word clouds are kept on disk; time the work,
+                # not the cache
+                cache.evict(0)
+                start = time.perf_counter()
+                func()
+                best = min(best, time.perf_counter() - start)
+            peak = _rss_mb()
+            if not _selected(name, only, skip):
+                continue
+            results.append({
+                'function': name,
+                'messages': n,
+                'seconds': best,
+                'messages_per_second': n / best if best > 0 else None,
+                'peak_rss_mb': peak,
+                'rss_growth_mb': max(peak - before, 0) if reset else None,
+            })
+    return {'messages': n, 'generate_seconds': generated, 'results': results}
+
+
+def run(sizes, only=(), skip=(), repeats=None, seed=0):
+    results = []
+    for n in sizes:
+        print(f"Running {n:,} messages...", flush=True)
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            size = pool.submit(run_size, n, only, skip, repeats, seed).result()
+        print(f"  generated the export in {size['generate_seconds']:.1f}s", flush=True)
+        results.extend(size['results'])
+    return results
+
+
+def machine():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != machine():
+            print(f"Note: the baseline in {path} was recorded on a different machine")
+        return {(r['function'], r['messages']): r for r in baseline['results']}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Error in load_baseline: {e}")
+        return {}
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # Adds the time relative to the baseline to every result that has one and
+    # marks the regressions; returns the regressed results
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['function'], result['messages']))
+        if previous is None or not previous.get('seconds'):
+            result['vs_baseline'] = None
+            continue
+        result['vs_baseline'] = result['seconds'] / previous['seconds']
+        result['regression'] = False
+        if result['vs_baseline'] > tolerance and result['seconds'] - previous['seconds'] > MIN_REGRESSION_SECONDS:
+            result['regression'] = True
+            regressions.append(result)
+    return regressions
+
+
+def print_table(results):
+    print(f"{'function':<34}{'messages':>11}{'seconds':>10}{'msgs/s':>13}{'peak RSS':>11}{'growth':>10}{'vs base':>12}")
+    for r in results:
+        ratio = r.get('vs_baseline')
+        if ratio is None:
+            change = '-'
+        else:
+            change = f"{ratio:.2f}x" + (' !' if r.get('regression') else '')
+        growth = '-' if r['rss_growth_mb'] is None else f"{r['rss_growth_mb']:.0f}MB"
+        rate = '-' if r['messages_per_second'] is None else f"{r['messages_per_second']:,.0f}"
+        print(f"{r['function']:<34}{r['messages']:>11,}{r['seconds']:>9.3f}s{rate:>13}"
+              f"{r['peak_rss_mb']:>9.0f}MB{growth:>10}{change:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the analysis pipeline on synthetic chats.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="messages per synthetic chat")
+    parser.add_argument('--only', nargs='*', default=[], help="run only functions whose name contains one of these")
+    parser.add_argument('--skip', nargs='*', default=[], help="skip functions whose name contains one of these")
+    parser.add_argument('--repeats', type=int, default=None, help="best of N runs (default: 3 up to 100k messages, else 1)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="baseline file to compare with")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="slowdown factor reported as a regression (default: %(default)s)")
+    parser.add_argument('--fail-on-regression', action='store_true', help="exit with status 1 on regressions")
+    parser.add_argument('-o', '--output', help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.only, args.skip, args.repeats, args.seed)
+    regressions = compare(results, load_baseline(args.baseline), args.tolerance)
+    print_table(results)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': machine(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} function(s) slower than the baseline by more than {args.tolerance}x:")
+        for r in regressions:
+            print(f"  {r['function']} at {r['messages']:,} messages: {r['vs_baseline']:.2f}x")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import preprocessor
+
+# Synthetic WhatsApp exports for the benchmarks. The text looks like a real
+# export: one line per message in any of the date/time layouts preprocess()
+# understands, members who post at different rates, more messages in the
+# evening than at night, Hinglish chatter, emoji (including skin tones, ZWJ
+# sequences and flags), links, media placeholders, group notifications and
+# messages that continue over several lines.
+#
+#   python benchmarks/synthetic.py 100000 -o chat.txt --date-format %m/%d/%Y --time-format "%I:%M %p"
+
+# The four date layouts of preprocessor.DATE_FORMATS with a typical clock for
+# each: Indian/UK phones (day first) and US phones (month first, 12-hour)
+EXPORT_FORMATS = [
+    ('%d/%m/%y', '%H:%M'),
+    ('%d/%m/%Y', '%H:%M:%S'),
+    ('%m/%d/%y', '%I:%M %p'),
+    ('%m/%d/%Y', '%I:%M:%S %p'),
+]
+
+CONTENT_WORDS = [
+    'meeting', 'exam', 'party', 'movie', 'train', 'office', 'chai', 'biryani', 'cricket', 'match',
+    'class', 'assignment', 'weekend', 'birthday', 'trip', 'photos', 'lunch', 'dinner', 'college',
+    'project', 'deadline', 'traffic', 'rain', 'shopping', 'ticket', 'hostel', 'notes', 'results',
+    'awesome', 'great', 'bad', 'tired', 'love', 'hate', 'sorry', 'thanks', 'congrats', 'happy',
+    'sad', 'angry', 'boring', 'amazing', 'terrible', 'funny', 'crazy', 'best', 'worst', 'lol',
+]
+
+EMOJI = ['😂', '🤣', '❤️', '👍', '🙏', '😭', '😍', '🔥', '🎉', '😅', '👍🏽', '🙏🏻', '👨‍👩‍👧', '🧑🏾‍💻', '🇮🇳', '1️⃣', '🤦‍♂️']
+
+URLS = [
+    'https://www.youtube.com/watch?v={}', 'https://maps.app.goo.gl/{}', 'www.example.com/page/{}',
+    'https://docs.google.com/document/d/{}/edit', 'instagram.com/p/{}',
+]
+
+FIRST_NAMES = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rahul', 'Isha',
+               'Karan', 'Meera', 'Aditya', 'Pooja', 'Nikhil', 'Riya', 'Sanjay', 'Divya', 'Amit', 'Neha']
+LAST_NAMES = ['Sharma', 'Patel', 'Singh', 'Iyer', 'Gupta', 'Reddy', 'Khan', 'Das', 'Nair', 'Mehta']
+
+ENCRYPTION_NOTICE = ('Messages and calls are end-to-end encrypted. No one outside of this chat, '
+                     'not even WhatsApp, can read or listen to them. Tap to learn more.')
+
+# Relative chat activity per hour of the day, quiet at night, busiest late evening
+HOURLY_WEIGHTS = np.array([3, 2, 1, 1, 1, 1, 2, 4, 6, 7, 7, 7, 8, 8, 7, 7, 7, 8, 9, 10, 11, 12, 10, 6], dtype=float)
+
+
+def hinglish_words(path=ROOT / 'stop_hinglish.txt'):
+    # The chat-filler words of the stop word list (hai, kal, yaar, ...);
+    # punctuation entries are left out
+    with open(path, encoding='utf-8') as f:
+        return [w for w in (line.strip() for line in f) if w.isalpha()]
+
+
+def member_names(count, rng):
+    # Saved contacts appear by name, unknown numbers as phone numbers
+    names = []
+    for i in range(count):
+        if i % 7 == 6:
+            names.append(f"+91 {rng.integers(70000, 99999)} {rng.integers(10000, 99999)}")
+        else:
+            first = FIRST_NAMES[i % len(FIRST_NAMES)]
+            last = LAST_NAMES[(i // len(FIRST_NAMES) + i) % len(LAST_NAMES)]
+            names.append(first if i % 3 == 0 else f"{first} {last}")
+    # Duplicates only happen for very large groups
+    return [name if names.index(name) == i else f"{name} {i}" for i, name in enumerate(names)]
+
+
+def _timestamps(n, years, seconds, rng, start):
+    days = rng.integers(0, int(365 * years), n)
+    hours = rng.choice(24, n, p=HOURLY_WEIGHTS / HOURLY_WEIGHTS.sum())
+    offsets = days * 86400 + hours * 3600 + rng.integers(0, 60, n) * 60
+    if seconds:
+        offsets = offsets + rng.integers(0, 60, n)
+    offsets.sort()
+    return pd.Timestamp(start) + pd.to_timedelta(offsets, unit='s')
+
+
+def _format(values, fmt):
+    # strftime once per distinct value (days, times of day) instead of per message
+    codes, uniques = pd.factorize(values)
+    return np.asarray(pd.DatetimeIndex(uniques).strftime(fmt), dtype=object)[codes]
+
+
+def generate_export(n, users=20, date_format='%d/%m/%y', time_format='%H:%M', multiline_ratio=0.03,
+                    emoji_ratio=0.15, url_ratio=0.02, media_ratio=0.05, notification_ratio=0.005,
+                    hinglish_ratio=0.6, years=3, start='2021-01-01', seed=0, newline='\n'):
+    # Export text with exactly n messages (n rows after preprocess(), the
+    # encryption notice and other notifications included). The ratios are
+    # per message; the rest of the words are Hinglish fillers with
+    # probability `hinglish_ratio` and content words otherwise.
+    if date_format not in preprocessor.DATE_FORMATS:
+        raise ValueError(f"date_format must be one of {', '.join(preprocessor.DATE_FORMATS)}")
+    if time_format not in preprocessor.TIME_FORMATS:
+        raise ValueError(f"time_format must be one of {', '.join(preprocessor.TIME_FORMATS)}")
+    if n <= 0:
+        return ''
+
+    rng = np.random.default_rng(seed)
+    names = member_names(users, rng)
+    # Some members post much more than others
+    activity = 1 / np.arange(1, users + 1) ** 0.8
+    authors = rng.choice(users, n, p=activity / activity.sum())
+
+    stamps = _timestamps(n, years, '%S' in time_format, rng, start)
+    dates = _format(stamps.normalize(), date_format)
+    times = _format(stamps - stamps.normalize() + pd.Timestamp('2000-01-01'), time_format)
+
+    # The word list is alphabetical; shuffle it so the most frequent fillers
+    # are not all words starting with "a"
+    fillers = rng.permutation(np.array(hinglish_words(), dtype=object))
+    vocabulary = np.concatenate([fillers, np.array(CONTENT_WORDS, dtype=object)])
+    hinglish_count = len(fillers)
+    lengths = np.minimum(rng.geometric(0.18, n), 40)
+    total = int(lengths.sum())
+    from_hinglish = rng.random(total) < hinglish_ratio
+    words = np.where(
+        from_hinglish,
+        # Zipf-like: the common fillers dominate, as in real chats
+        np.minimum(rng.zipf(1.3, total) - 1, hinglish_count - 1),
+        hinglish_count + rng.integers(0, len(CONTENT_WORDS), total),
+    )
+    words = vocabulary[words]
+    ends = np.cumsum(lengths)
+
+    kind = rng.random(n)
+    is_media = kind < media_ratio
+    is_notification = (kind >= media_ratio) & (kind < media_ratio + notification_ratio)
+    has_emoji = rng.random(n) < emoji_ratio
+    has_url = rng.random(n) < url_ratio
+    has_more_lines = rng.random(n) < multiline_ratio
+    extras = rng.integers(0, 1 << 30, n)
+
+    lines = []
+    for i in range(n):
+        if i == 0:
+            body = ENCRYPTION_NOTICE
+        elif is_notification[i]:
+            other = names[extras[i] % users]
+            body = (f"{names[authors[i]]} added {other}", f"{other} left",
+                    f'{names[authors[i]]} changed the subject to "Plans {extras[i] % 100}"')[extras[i] % 3]
+        elif is_media[i]:
+            body = f"{names[authors[i]]}: <Media omitted>"
+        else:
+            text = words[ends[i] - lengths[i]:ends[i]]
+            if has_emoji[i]:
+                text = list(text)
+                # One or a few emoji, sometimes glued to a word
+                for j in range(1 + extras[i] % 3):
+                    emoji = EMOJI[(extras[i] >> (4 * j)) % len(EMOJI)]
+                    if extras[i] & 1 and text:
+                        text[-1] += emoji
+                    else:
+                        text.append(emoji)
+            text = ' '.join(text)
+            if has_url[i]:
+                text += ' ' + URLS[extras[i] % len(URLS)].format(f"{extras[i]:x}")
+            if has_more_lines[i]:
+                tail = words[ends[i - 1] - lengths[i - 1]:ends[i - 1]] if i > 0 else ()
+                text += newline + ' '.join(tail) + newline + f"{extras[i] % 10} points to discuss"
+            body = f"{names[authors[i]]}: {text}"
+        lines.append(f"{dates[i]}, {times[i]} - {body}")
+    return newline.join(lines) + newline
+
+
+def write_export(path, n, **options):
+    # Writes generate_export(n, **options) as UTF-8, the way WhatsApp does
+    path = Path(path)
+    path.write_text(generate_export(n, **options), encoding='utf-8', newline='')
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic WhatsApp chat export.")
+    parser.add_argument('messages', type=int)
+    parser.add_argument('-o', '--output', default='synthetic_chat.txt')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--date-format', default='%d/%m/%y', choices=preprocessor.DATE_FORMATS)
+    parser.add_argument('--time-format', default='%H:%M', choices=preprocessor.TIME_FORMATS)
+    parser.add_argument('--multiline-ratio', type=float, default=0.03)
+    parser.add_argument('--emoji-ratio', type=float, default=0.15)
+    parser.add_argument('--url-ratio', type=float, default=0.02)
+    parser.add_argument('--media-ratio', type=float, default=0.05)
+    parser.add_argument('--hinglish-ratio', type=float, default=0.6)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    path = write_export(
+        args.output, args.messages, users=args.users, date_format=args.date_format,
+        time_format=args.time_format, multiline_ratio=args.multiline_ratio, emoji_ratio=args.emoji_ratio,
+        url_ratio=args.url_ratio, media_ratio=args.media_ratio, hinglish_ratio=args.hinglish_ratio,
+        seed=args.seed,
+    )
+    print(f"Wrote {args.messages:,} messages to {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from preprocessor import DAY_NAMES, MONTH_NAMES
+
+# Time bucketing on integers. Every message is reduced once to minutes since
+# 1970-01-01 (wall-clock time, optionally shifted into another time zone);
+# each bucket is then plain integer arithmetic on that array and counts are
+# np.bincount over the codes, so nothing copies or pivots the frame.
+#
+# Cyclic buckets (hour of day, weekday, ...) have a fixed set of labels.
+# Linear buckets (day, week, month, ...) count from 1970 and are labelled with
+# the range between the first and last message of the selection.
+
+MINUTES_PER_DAY = 24 * 60
+NS_PER_MINUTE = 60 * 1_000_000_000
+
+
+def local_minutes(message_date, tz=None, source_tz=None):
+    # Minutes since the epoch as seen on a clock in `tz`. Exports carry the
+    # exporting phone's wall-clock time, so shifting needs both zones; with
+    # either missing the times are used as exported.
+    if tz and source_tz and tz != source_tz:
+        dates = pd.Series(message_date, copy=False)
+        # Clock-change edge cases: the repeated hour is read as standard time,
+        # a skipped hour is moved forward
+        dates = dates.dt.tz_localize(
+            source_tz, ambiguous=np.zeros(len(dates), dtype=bool), nonexistent='shift_forward'
+        ).dt.tz_convert(tz).dt.tz_localize(None)
+        message_date = dates
+    values = pd.Series(message_date, copy=False).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    return values // NS_PER_MINUTE
+
+
+def _days(minutes):
+    return minutes // MINUTES_PER_DAY
+
+
+def _months(minutes):
+    # Calendar months since 1970-01, via numpy's datetime units
+    return _days(minutes).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def _slot_labels(size):
+    return pd.Index([f"{m // 60:02d}:{m % 60:02d}" for m in range(0, MINUTES_PER_DAY, size)], name='slot')
+
+
+def _slot(size):
+    return {
+        'codes': lambda minutes: (minutes % MINUTES_PER_DAY) // size,
+        'labels': lambda: _slot_labels(size),
+    }
+
+
+CYCLIC = {
+    'hour': {
+        'codes': lambda minutes: (minutes % MINUTES_PER_DAY) // 60,
+        'labels': lambda: pd.RangeIndex(24, name='hour'),
+    },
+    'slot30': _slot(30),
+    'slot15': _slot(15),
+    'weekday': {
+        # 1970-01-01 was a Thursday; Monday is 0
+        'codes': lambda minutes: (_days(minutes) + 3) % 7,
+        'labels': lambda: pd.Index(DAY_NAMES, name='day_name'),
+    },
+    'day_of_month': {
+        'codes': lambda minutes: _days(minutes) - _months(minutes).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64),
+        'labels': lambda: pd.RangeIndex(1, 32, name='day_of_month'),
+    },
+    'month_of_year': {
+        'codes': lambda minutes: _months(minutes) % 12,
+        'labels': lambda: pd.Index(MONTH_NAMES, name='month'),
+    },
+    'quarter_of_year': {
+        'codes': lambda minutes: (_months(minutes) % 12) // 3,
+        'labels': lambda: pd.Index(['Q1', 'Q2', 'Q3', 'Q4'], name='quarter'),
+    },
+}
+
+LINEAR = {
+    'day': {
+        'codes': _days,
+        'labels': lambda first, last: pd.DatetimeIndex(
+            np.arange(first, last + 1).astype('datetime64[D]').astype('datetime64[ns]'), name='day'
+        ),
+    },
+    'week': {
+        # ISO weeks, Monday to Sunday; 1969-12-29 was the Monday of week 0
+        'codes': lambda minutes: (_days(minutes) + 3) // 7,
+        'labels': lambda first, last: pd.PeriodIndex.from_ordinals(np.arange(first, last + 1) + 1, freq='W-SUN').rename('week'),
+    },
+    'month': {
+        'codes': _months,
+        'labels': lambda first, last: pd.PeriodIndex.from_ordinals(np.arange(first, last + 1), freq='M').rename('month'),
+    },
+    'quarter': {
+        'codes': lambda minutes: _months(minutes) // 3,
+        'labels': lambda first, last: pd.PeriodIndex.from_ordinals(np.arange(first, last + 1), freq='Q-DEC').rename('quarter'),
+    },
+    'year': {
+        'codes': lambda minutes: _months(minutes) // 12,
+        'labels': lambda first, last: pd.PeriodIndex.from_ordinals(np.arange(first, last + 1), freq='Y').rename('year'),
+    },
+}
+
+BUCKETS = sorted(CYCLIC) + sorted(LINEAR)
+
+
+def bucket_codes(minutes, bucket):
+    # int32 code per message: position within the cycle for cyclic buckets,
+    # buckets since 1970 for linear ones
+    spec = CYCLIC.get(bucket) or LINEAR.get(bucket)
+    if spec is None:
+        raise ValueError(f"Unknown bucket {bucket!r}, expected one of {', '.join(BUCKETS)}")
+    return spec['codes'](np.asarray(minutes, dtype=np.int64)).astype(np.int32)
+
+
+def _axis(bucket, codes):
+    # (codes from 0, labels) for one dimension of a count
+    if bucket in CYCLIC:
+        labels = CYCLIC[bucket]['labels']()
+        return codes.astype(np.int64), labels
+    if len(codes) == 0:
+        return codes.astype(np.int64), LINEAR[bucket]['labels'](0, -1)
+    first, last = int(codes.min()), int(codes.max())
+    return codes.astype(np.int64) - first, LINEAR[bucket]['labels'](first, last)
+
+
+def count_vector(codes, bucket):
+    # Series of messages per bucket; linear buckets run from the first to
+    # the last message with empty buckets as 0
+    positions, labels = _axis(bucket, codes)
+    counts = np.bincount(positions, minlength=len(labels))
+    return pd.Series(counts, index=labels, name='count')
+
+
+def count_matrix(row_codes, row_bucket, col_codes, col_bucket):
+    # DataFrame of messages per (row bucket, column bucket)
+    rows, row_labels = _axis(row_bucket, row_codes)
+    cols, col_labels = _axis(col_bucket, col_codes)
+    counts = np.bincount(rows * len(col_labels) + cols, minlength=len(row_labels) * len(col_labels))
+    return pd.DataFrame(counts.reshape(len(row_labels), len(col_labels)), index=row_labels, columns=col_labels)
@@ -0,0 +1,180 @@
+import hashlib
+import io
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Parsed chats and derived artifacts are only written to disk when a cache
+# directory is configured: CHAT_CACHE_DIR, or CHAT_DISK_CACHE=1 for
+# .chat_cache next to the code. Off by default, so uploads to a deployed app
+# stay in memory.
+CACHE_DIR = Path(os.environ.get('CHAT_CACHE_DIR') or Path(__file__).with_name('.chat_cache'))
+ENABLED = bool(os.environ.get('CHAT_CACHE_DIR')) or os.environ.get('CHAT_DISK_CACHE', '0') == '1'
+MAX_CACHE_BYTES = int(os.environ.get('CHAT_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Bump whenever preprocess() changes its output so stale frames are not reused
+FRAME_VERSION = 2
+
+HASH_CHUNK_SIZE = 1 << 20
+
+stats = {'hits': 0, 'misses': 0, 'artifact_hits': 0, 'artifact_misses': 0, 'evictions': 0}
+
+
+def content_hash(source):
+    # Hashes raw bytes or a binary file object without reading it all at once
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+        return digest.hexdigest()
+
+    position = source.tell()
+    while True:
+        chunk = source.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    source.seek(position)
+    return digest.hexdigest()
+
+
+def _frame_path(key):
+    return CACHE_DIR / f"{key}.v{FRAME_VERSION}.parquet"
+
+
+def load_frame(key):
+    path = _frame_path(key)
+    if not ENABLED or not path.exists():
+        stats['misses'] += 1
+        return None
+
+    try:
+        df = pd.read_parquet(path, memory_map=True)
+    except Exception as e:
+        print(f"Error reading cached chat {path.name}: {e}")
+        stats['misses'] += 1
+        return None
+
+    # The modification time doubles as the "last used" stamp for eviction
+    os.utime(path)
+    stats['hits'] += 1
+    return df
+
+
+def store_frame(key, df):
+    if not ENABLED:
+        return
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = _frame_path(key)
+        tmp_path = path.with_name(path.name + '.tmp')
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        evict()
+    except Exception as e:
+        print(f"Error caching chat {key}: {e}")
+
+
+def load_bytes(name):
+    # Derived artifacts (word cloud PNGs, score arrays) share the directory and
+    # the eviction budget with parsed chats
+    path = CACHE_DIR / name
+    if not ENABLED:
+        stats['artifact_misses'] += 1
+        return None
+    try:
+        data = path.read_bytes()
+    except OSError:
+        stats['artifact_misses'] += 1
+        return None
+    os.utime(path)
+    stats['artifact_hits'] += 1
+    return data
+
+
+def store_bytes(name, data):
+    # True when the file was written, False with the cache off or on errors
+    if not ENABLED:
+        return False
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = CACHE_DIR / name
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        evict()
+        return True
+    except Exception as e:
+        print(f"Error caching {name}: {e}")
+        return False
+
+
+def load_array(name):
+    data = load_bytes(name)
+    if data is None:
+        return None
+    return np.load(io.BytesIO(data))
+
+
+def store_array(name, array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return store_bytes(name, buffer.getvalue())
+
+
+def load_table(name):
+    # A count Series stored by store_table, indexed by every other column
+    data = load_bytes(name)
+    if data is None:
+        return None
+    table = pd.read_parquet(io.BytesIO(data))
+    return table.set_index(list(table.columns[:-1]))['value']
+
+
+def store_table(name, table):
+    buffer = io.BytesIO()
+    table.to_frame('value').reset_index().to_parquet(buffer, index=False)
+    return store_bytes(name, buffer.getvalue())
+
+
+def _cached_files():
+    if not CACHE_DIR.exists():
+        return []
+    # .json files are bookkeeping (the export registry and its lock), not
+    # evictable entries
+    return [p for p in CACHE_DIR.iterdir() if p.is_file() and not p.name.endswith(('.tmp', '.json', '.lock'))]
+
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    # Least recently used files go first until the directory fits the budget
+    entries = []
+    for path in _cached_files():
+        st = path.stat()
+        entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        stats['evictions'] += 1
+
+
+def purge():
+    # Deletes everything in the cache directory, bookkeeping included;
+    # returns the number of files removed
+    removed = 0
+    if not CACHE_DIR.exists():
+        return removed
+    for path in CACHE_DIR.iterdir():
+        if path.is_file():
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def cache_stats():
+    entries = _cached_files()
+    return dict(stats, entries=len(entries), bytes=sum(p.stat().st_size for p in entries))
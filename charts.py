@@ -0,0 +1,234 @@
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from matplotlib.figure import Figure
+import cache
+import helper
+import pools
+from chat_index import as_chat_index
+from memo import Fallback, memoize
+from profiling import profiled
+
+# Chart rendering for the app and the batch runner. Every chart is drawn on
+# its own matplotlib Figure (not pyplot, so nothing is registered globally and
+# nothing has to be closed), rendered to PNG with the Agg canvas and cached
+# per chat, user, chart and options: in memory through memoize and on disk
+# next to the parsed chat. submit() returns a future from a small thread pool
+# so the page can lay out text and tables meanwhile. Drawing with Agg holds
+# the GIL, so threads alone never overlap charts: the aggregates are computed
+# in the thread and the figure is drawn in a pool of spawned processes, which
+# lets cold charts render side by side on machines with more than one core.
+# On a single core, or with CHAT_CHART_PROCESSES=0, they are drawn in the
+# thread.
+
+CHART_VERSION = 1
+DPI = 200
+MAX_WORKERS = int(os.environ.get('CHAT_CHART_WORKERS', 4))
+DRAW_PROCESSES = int(os.environ.get('CHAT_CHART_PROCESSES', min(MAX_WORKERS, os.cpu_count() or 1)))
+
+_executor = None
+_draw_executor = None
+_executor_lock = threading.Lock()
+
+
+def _timeline(selected_user, chat, tz, source_tz, variant):
+    if variant in (None, 'month'):
+        return helper.monthly_timeline(selected_user, chat, tz, source_tz)
+    return helper.activity_timeline(selected_user, chat, variant, tz, source_tz)
+
+
+def _labels(index):
+    return [str(label) for label in index]
+
+
+def _line(fig, x, y, color):
+    ax = fig.subplots()
+    ax.plot(x, y, color=color, linewidth=2)
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+def _bar(fig, series, color):
+    ax = fig.subplots()
+    ax.bar(_labels(series.index), series.to_numpy(), color=color)
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+def _heatmap(fig, matrix):
+    # seaborn pulls in scipy bits; only the heatmap needs it
+    import seaborn as sns
+    sns.heatmap(matrix, cmap='YlOrRd', ax=fig.subplots())
+
+
+def _common_words(fig, words):
+    ax = fig.subplots()
+    ax.barh(words[0], words[1])
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+def _sentiment_pie(fig, counts):
+    ax = fig.subplots()
+    ax.pie(counts['Count'], labels=counts['Sentiment'], autopct='%1.1f%%', startangle=140,
+           colors=['green', 'red', 'grey'])
+    ax.axis('equal')
+
+
+def _sentiment_estimate(fig, estimate):
+    # Estimated share of each sentiment with its 95% interval
+    ax = fig.subplots()
+    colors = {'Positive': 'green', 'Negative': 'red', 'Neutral': 'grey'}
+    errors = [estimate['Share'] - estimate['Low'], estimate['High'] - estimate['Share']]
+    ax.bar(estimate['Sentiment'], estimate['Share'] * 100, yerr=[e * 100 for e in errors], capsize=8,
+           color=[colors.get(s, 'grey') for s in estimate['Sentiment']])
+    ax.set_ylabel('% of messages (estimate)')
+
+
+def _sentiment_sample(selected_user, chat, tz, source_tz, variant):
+    import sentiment
+    return sentiment.sample_sentiment(chat, selected_user)[0]
+
+
+def _sentiment_counts(selected_user, chat, tz, source_tz, variant):
+    import sentiment
+    return sentiment.analyze_sentiment(chat, selected_user)[1]
+
+
+# name -> figure size, data (selected_user, chat, tz, source_tz, variant) and
+# the drawing function. `variant` is the timeline bucket or the heatmap slot.
+CHARTS = {
+    'timeline': {
+        'size': (10, 4),
+        'data': _timeline,
+        'draw': lambda fig, t: _line(fig, t['time'], t['message'], 'green'),
+    },
+    'daily_timeline': {
+        'size': (10, 4),
+        'data': lambda user, chat, tz, source_tz, variant: helper.daily_timeline(user, chat, tz, source_tz),
+        'draw': lambda fig, t: _line(fig, t['only_date'], t['message'], 'blue'),
+    },
+    'week_activity': {
+        'size': (10, 4),
+        'data': lambda user, chat, tz, source_tz, variant: helper.week_activity_map(user, chat, tz, source_tz),
+        'draw': lambda fig, s: _bar(fig, s, 'purple'),
+    },
+    'month_activity': {
+        'size': (10, 4),
+        'data': lambda user, chat, tz, source_tz, variant: helper.month_activity_map(user, chat, tz, source_tz),
+        'draw': lambda fig, s: _bar(fig, s, 'orange'),
+    },
+    'activity_heatmap': {
+        'size': (12, 6),
+        'data': lambda user, chat, tz, source_tz, variant: helper.activity_heatmap(user, chat, variant or 'hour', tz, source_tz),
+        'draw': _heatmap,
+    },
+    'busy_users': {
+        'size': (10, 4),
+        'data': lambda user, chat, tz, source_tz, variant: helper.most_busy_users(chat)[0],
+        'draw': lambda fig, s: _bar(fig, s, 'red'),
+    },
+    'common_words': {
+        'size': (10, 8),
+        'data': lambda user, chat, tz, source_tz, variant: helper.most_common_words(user, chat),
+        'draw': _common_words,
+    },
+    'sentiment': {
+        'size': (6.4, 4.8),
+        'data': _sentiment_counts,
+        'draw': _sentiment_pie,
+    },
+    'sentiment_preview': {
+        'size': (6.4, 4.8),
+        'data': _sentiment_sample,
+        'draw': _sentiment_estimate,
+    },
+}
+
+
+def render_png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=DPI, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def _draw(chart, data):
+    spec = CHARTS[chart]
+    fig = Figure(figsize=spec['size'])
+    spec['draw'](fig, data)
+    return render_png(fig)
+
+
+def _draw_pool():
+    global _draw_executor
+    if DRAW_PROCESSES <= 1:
+        return None
+    with _executor_lock:
+        if _draw_executor is None:
+            _draw_executor = pools.spawn_pool(DRAW_PROCESSES)
+        return _draw_executor
+
+
+def _render(chart, data):
+    # Draws in the process pool when there is one; only the aggregate and the
+    # PNG cross the process boundary
+    global _draw_executor
+    pool = _draw_pool()
+    if pool is not None:
+        try:
+            return pool.submit(_draw, chart, data).result()
+        except BrokenProcessPool as e:
+            print(f"Error in chart process pool, drawing in this thread: {e}")
+            with _executor_lock:
+                _draw_executor = None
+    return _draw(chart, data)
+
+
+@memoize(spill=False)
+@profiled()
+def chart_png(chart, selected_user, df, tz=None, source_tz=None, variant=None):
+    # PNG bytes of one chart, None when there is nothing to draw. The word
+    # cloud is rendered by WordCloud itself and comes from helper.
+    try:
+        chat = as_chat_index(df)
+        if chart == 'wordcloud':
+            return helper.wordcloud_image(selected_user, chat)
+        if chart not in CHARTS:
+            raise ValueError(f"Unknown chart {chart!r}")
+
+        options = repr((CHART_VERSION, DPI, selected_user, tz, source_tz, variant))
+        digest = hashlib.blake2b(options.encode('utf-8'), digest_size=8).hexdigest()
+        name = f"{chat.key}.chart.{chart}.{digest}.png"
+        png = cache.load_bytes(name)
+        if png is not None:
+            return png
+
+        data = CHARTS[chart]['data'](selected_user, chat, tz, source_tz, variant)
+        if data is None or data.size == 0:
+            return None
+        png = _render(chart, data)
+        cache.store_bytes(name, png)
+        return png
+    except Exception as e:
+        print(f"Error in chart_png ({chart}): {e}")
+        return Fallback(None)
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='charts')
+        return _executor
+
+
+def submit(chart, selected_user, df, tz=None, source_tz=None, variant=None):
+    # Future for chart_png(...), rendered in the shared thread pool
+    return _pool().submit(chart_png, chart, selected_user, df, tz, source_tz, variant)
+
+
+def render_all(charts, selected_user, df, tz=None, source_tz=None, variants=None):
+    # {chart: PNG bytes or None} for several charts, rendered concurrently
+    variants = variants or {}
+    futures = {chart: submit(chart, selected_user, df, tz, source_tz, variants.get(chart)) for chart in charts}
+    return {chart: future.result() for chart, future in futures.items()}
@@ -0,0 +1,316 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import cached_property
+import numpy as np
+import pandas as pd
+from links import count_links
+from emojis import count_emojis
+from tokens import tokenize, STOP_WORDS_KEY
+from preprocessor import concat_frames
+from buckets import local_minutes, bucket_codes, count_vector, count_matrix
+import cache
+
+MEDIA_PLACEHOLDER = '<Media omitted>'
+
+# Bump whenever link counting, tokenizing or emoji detection changes so the
+# counts kept on disk are recomputed
+LINKS_VERSION = 1
+TABLES_VERSION = 1
+
+
+class ChatIndex:
+    # Built once per parsed chat. Rows are grouped by user so a single user's
+    # messages are one slice of `order`, and every per-user count the helpers
+    # need is computed for all users in one pass the first time it is asked for.
+
+    def __init__(self, df, key=None):
+        self.df = df
+        if key is not None:
+            self.key = key
+        # preprocess() already stores users as a sorted categorical, so this
+        # normally reuses its codes instead of hashing every name again
+        users = pd.Categorical(df['user']).remove_unused_categories()
+        if not users.categories.is_monotonic_increasing:
+            users = users.reorder_categories(users.categories.sort_values())
+        self.users = users.categories
+        self.codes = users.codes
+
+        counts = np.bincount(self.codes, minlength=len(self.users))
+        self.order = np.argsort(self.codes, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.message_counts = pd.Series(counts, index=self.users.rename('user'), name='count')
+
+        # Filled in by sentiment.chat_scores() on first use
+        self.sentiment_scores = None
+
+        # Time-bucket arrays, per (time zones) and per (bucket, time zones)
+        self._minutes = {}
+        self._bucket_codes = {}
+
+    @cached_property
+    def key(self):
+        # Stable fingerprint of the chat for caches; the app passes the
+        # export's content hash instead
+        hashed = pd.util.hash_pandas_object(self.df[['message_date', 'user', 'message']], index=False)
+        return hashlib.blake2b(hashed.to_numpy().tobytes(), digest_size=20).hexdigest()
+
+    def append(self, tail, key=None):
+        # ChatIndex for these messages followed by `tail` (a frame of newer
+        # messages). Whatever was already computed here is carried over, so
+        # only the tail's messages are processed.
+        df = concat_frames([self.df, tail])
+        merged = ChatIndex(df, key)
+        new = ChatIndex(tail)
+
+        old_codes = merged.users.get_indexer(self.users)
+        new_codes = merged.users.get_indexer(new.users)
+
+        for name in ('media_mask', 'text_mask', 'link_counts'):
+            if name in self.__dict__:
+                merged.__dict__[name] = np.concatenate([self.__dict__[name], getattr(new, name)])
+
+        if '_tokens' in self.__dict__:
+            old_words, old_terms = self._tokens
+            new_words, new_terms = new._tokens
+            merged._tokens = (
+                np.concatenate([old_words, new_words]),
+                _merge_counts(old_terms, old_codes, new_terms, new_codes, sort=False)
+            )
+
+        if 'emoji_counts' in self.__dict__:
+            merged.emoji_counts = _merge_counts(self.emoji_counts, old_codes, new.emoji_counts, new_codes)
+
+        for zones, minutes in self._minutes.items():
+            merged._minutes[zones] = np.concatenate([minutes, new.minutes(*zones)])
+        for (bucket, *zones), codes in self._bucket_codes.items():
+            merged._bucket_codes[(bucket, *zones)] = np.concatenate([codes, new.bucket_codes(bucket, *zones)])
+
+        return merged
+
+    def __len__(self):
+        return len(self.df)
+
+    def user_code(self, selected_user):
+        if selected_user == 'Overall':
+            return None
+        code = self.users.get_indexer([selected_user])[0]
+        if code < 0:
+            raise KeyError(selected_user)
+        return code
+
+    def rows(self, selected_user):
+        code = self.user_code(selected_user)
+        if code is None:
+            return None
+        return self.order[self.offsets[code]:self.offsets[code + 1]]
+
+    def frame(self, selected_user):
+        rows = self.rows(selected_user)
+        if rows is None:
+            return self.df
+        return self.df.iloc[rows]
+
+    # Per-message columns
+
+    @cached_property
+    def media_mask(self):
+        return self.df['message'].str.contains(MEDIA_PLACEHOLDER, na=False, regex=False).to_numpy()
+
+    @cached_property
+    def text_mask(self):
+        # Messages that count towards word statistics: real text from members
+        return (self.df['user'] != 'group_notification').to_numpy() & ~self.media_mask
+
+    @cached_property
+    def _tokens(self):
+        tokens = self._stored_tokens()
+        if tokens is None:
+            tokens = tokenize(self.df['message'], self.codes, self.text_mask)
+            self._store_tokens(tokens)
+        return tokens
+
+    @cached_property
+    def word_counts(self):
+        return self._tokens[0]
+
+    @cached_property
+    def term_counts(self):
+        # (user_code, token) -> count, stop words removed
+        return self._tokens[1]
+
+    @cached_property
+    def link_counts(self):
+        # URLExtract is slow enough that the counts are kept on disk too
+        counts = cache.load_array(self._links_name())
+        if counts is None:
+            counts = count_links(self.df['message'])
+            cache.store_array(self._links_name(), counts)
+        return counts
+
+    # Per-user aggregates
+
+    def _per_user(self, values):
+        return np.bincount(self.codes, weights=values, minlength=len(self.users)).astype(np.int64)
+
+    @cached_property
+    def word_totals(self):
+        return self._per_user(self.word_counts)
+
+    @cached_property
+    def media_totals(self):
+        return self._per_user(self.media_mask)
+
+    @cached_property
+    def link_totals(self):
+        return self._per_user(self.link_counts)
+
+    @cached_property
+    def emoji_counts(self):
+        counts = self._stored_emojis()
+        if counts is None:
+            counts = count_emojis(self.df['message'], self.codes)
+            cache.store_table(self._emojis_name(), counts)
+        return counts
+
+    # The link, token and emoji passes on disk, next to the parsed chat
+
+    def _links_name(self):
+        return f"{self.key}.links.v{LINKS_VERSION}.npy"
+
+    def _tokens_names(self):
+        prefix = f"{self.key}.tokens.{STOP_WORDS_KEY}.v{TABLES_VERSION}"
+        return f"{prefix}.words.npy", f"{prefix}.terms.parquet"
+
+    def _emojis_name(self):
+        return f"{self.key}.emojis.v{TABLES_VERSION}.parquet"
+
+    def _stored_tokens(self):
+        words_name, terms_name = self._tokens_names()
+        words = cache.load_array(words_name)
+        terms = cache.load_table(terms_name) if words is not None else None
+        if terms is None:
+            return None
+        return words, terms.rename(None)
+
+    def _store_tokens(self, tokens):
+        words_name, terms_name = self._tokens_names()
+        cache.store_array(words_name, tokens[0])
+        cache.store_table(terms_name, tokens[1])
+
+    def _stored_emojis(self):
+        counts = cache.load_table(self._emojis_name())
+        return None if counts is None else counts.rename('Count')
+
+    def load_stored(self):
+        # Pulls in the passes an earlier run left on disk, without computing
+        # anything, so append() can carry them over after a restart
+        stored = {
+            'link_counts': lambda: cache.load_array(self._links_name()),
+            '_tokens': self._stored_tokens,
+            'emoji_counts': self._stored_emojis,
+        }
+        for name, load in stored.items():
+            if name not in self.__dict__:
+                value = load()
+                if value is not None:
+                    self.__dict__[name] = value
+
+    def store_computed(self):
+        # Writes the passes computed (or carried over) so far under this key
+        if 'link_counts' in self.__dict__:
+            cache.store_array(self._links_name(), self.link_counts)
+        if '_tokens' in self.__dict__:
+            self._store_tokens(self._tokens)
+        if 'emoji_counts' in self.__dict__:
+            cache.store_table(self._emojis_name(), self.emoji_counts)
+
+    # Time buckets (see buckets.py)
+
+    def minutes(self, tz=None, source_tz=None):
+        zones = _zones(tz, source_tz)
+        if zones not in self._minutes:
+            self._minutes[zones] = local_minutes(self.df['message_date'], *zones)
+        return self._minutes[zones]
+
+    def bucket_codes(self, bucket, tz=None, source_tz=None):
+        key = (bucket, *_zones(tz, source_tz))
+        if key not in self._bucket_codes:
+            self._bucket_codes[key] = bucket_codes(self.minutes(tz, source_tz), bucket)
+        return self._bucket_codes[key]
+
+    def _user_codes(self, bucket, selected_user, tz, source_tz):
+        codes = self.bucket_codes(bucket, tz, source_tz)
+        rows = self.rows(selected_user)
+        return codes if rows is None else codes[rows]
+
+    def bucket_counts(self, bucket, selected_user='Overall', tz=None, source_tz=None):
+        # Messages per bucket, e.g. per 'month' or per 'weekday'
+        return count_vector(self._user_codes(bucket, selected_user, tz, source_tz), bucket)
+
+    def bucket_matrix(self, row_bucket, col_bucket, selected_user='Overall', tz=None, source_tz=None):
+        # Messages per (row bucket, column bucket), e.g. weekday x hour
+        return count_matrix(
+            self._user_codes(row_bucket, selected_user, tz, source_tz), row_bucket,
+            self._user_codes(col_bucket, selected_user, tz, source_tz), col_bucket
+        )
+
+    def counts(self, table, selected_user, sort=True):
+        # Slice one of the (user_code, ...) tables, or sum it for 'Overall'
+        code = self.user_code(selected_user)
+        levels = list(range(1, table.index.nlevels))
+        if code is None:
+            return table.groupby(level=levels, sort=sort, observed=True).sum()
+        try:
+            return table.xs(code, level=0)
+        except KeyError:
+            return table.iloc[:0].droplevel(0)
+
+    def total(self, totals, selected_user):
+        code = self.user_code(selected_user)
+        if code is None:
+            return int(totals.sum())
+        return int(totals[code])
+
+
+def _zones(tz, source_tz):
+    # Times are only shifted when both zones are known and differ
+    if tz and source_tz and tz != source_tz:
+        return (tz, source_tz)
+    return (None, None)
+
+
+def _merge_counts(old, old_codes, new, new_codes, sort=True):
+    # Add two (user_code, ...) count tables whose user codes come from
+    # different ChatIndex objects
+    old = old.rename(index=dict(enumerate(old_codes)), level=0)
+    new = new.rename(index=dict(enumerate(new_codes)), level=0)
+    levels = list(range(old.index.nlevels))
+    return pd.concat([old, new]).groupby(level=levels, sort=sort, observed=True).sum()
+
+
+# ChatIndex of the last few frames passed in as plain DataFrames, so calling
+# analysis functions with the same frame (once per member, say) hashes it
+# and runs the per-message passes once. Keyed by id(); the entry keeps its
+# frame alive, so the id cannot be reused while it is here.
+INDEX_ENTRIES = int(os.environ.get('CHAT_INDEX_ENTRIES', 4))
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def as_chat_index(df):
+    if isinstance(df, ChatIndex):
+        return df
+    with _indexes_lock:
+        chat = _indexes.get(id(df))
+        if chat is not None and chat.df is df:
+            _indexes.move_to_end(id(df))
+            return chat
+    chat = ChatIndex(df)
+    if INDEX_ENTRIES > 0:
+        with _indexes_lock:
+            _indexes[id(df)] = chat
+            while len(_indexes) > INDEX_ENTRIES:
+                _indexes.popitem(last=False)
+    return chat
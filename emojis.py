@@ -0,0 +1,208 @@
+import re
+import numpy as np
+import pandas as pd
+from profiling import profiled
+import emoji
+
+
+def _trie_pattern(node):
+    # node maps a character to its child node; '' marks the end of an emoji.
+    # Children are tried before stopping, so the longest sequence wins.
+    singles = []
+    branches = []
+    for char in sorted(k for k in node if k):
+        child = node[char]
+        if set(child) == {''}:
+            singles.append(re.escape(char))
+        else:
+            branches.append(re.escape(char) + _trie_pattern(child))
+
+    if singles:
+        branches.append(singles[0] if len(singles) == 1 else '[' + ''.join(singles) + ']')
+
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        pattern = '(?:' + pattern + ')?'
+    return pattern
+
+
+def _build_tails(emojis):
+    # For every possible first character, one regex matching the longest
+    # rest of an emoji sequence from there (possibly empty)
+    trie = {}
+    for e in emojis:
+        node = trie
+        for char in e:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    tails = {}
+    for char, node in trie.items():
+        rest = {k: v for k, v in node.items() if k}
+        if not rest:
+            tails[char] = re.compile('')
+        else:
+            tails[char] = re.compile(_trie_pattern(node))
+    return tails
+
+
+TAILS = _build_tails(emoji.EMOJI_DATA)
+
+# Lookup table over every code point: can an emoji start here, is it a
+# keycap start or mark, and can it continue a sequence (skin tones, ZWJ,
+# variation selectors, tags, the later members of a ZWJ family...).
+# Keycaps start with '#', '*' or a digit, which are far too common to try
+# everywhere, so those need the mark to follow.
+FIRST, KEYCAP_START, KEYCAP_MARK, CONTINUATION = 1, 2, 4, 8
+FLAGS = np.zeros(0x110000, dtype=np.uint8)
+FLAGS[[ord(c) for c in TAILS if ord(c) >= 0x80]] |= FIRST
+FLAGS[[ord(c) for c in TAILS if ord(c) < 0x80]] |= KEYCAP_START
+FLAGS[[0xFE0F, 0x20E3]] |= KEYCAP_MARK
+FLAGS[list({ord(c) for e in emoji.EMOJI_DATA for c in e[1:]})] |= CONTINUATION
+MAX_LENGTH = max(len(e) for e in emoji.EMOJI_DATA)
+
+
+def _scan_codes(text):
+    # Returns (start positions, emoji ids, emojis by id) for every emoji
+    # sequence in text, in no particular order.
+    #
+    # The text is cut with numpy into runs that could hold emoji: a possible
+    # first character followed by the characters joined to it. No emoji
+    # spans two runs, and almost every run is exactly one emoji, so runs are
+    # grouped by their code points and only each distinct run is looked up
+    # in Python. Runs that are not a known emoji as a whole (adjacent emoji
+    # that share characters, stray skin tones...) are matched one by one.
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    # Only non-ASCII characters matter, plus the ASCII start of a keycap
+    # right before its mark; `where` holds their positions and `next_to`
+    # whether the previous one of them is right before
+    high = np.flatnonzero(codes >= 0x80)
+    before = high[(high > 0) & ((FLAGS[codes[high]] & KEYCAP_MARK) != 0)] - 1
+    keycaps = np.unique(before[(FLAGS[codes[before]] & KEYCAP_START) != 0])
+    where = np.insert(high, np.searchsorted(high, keycaps), keycaps)
+    codes = codes[where]
+    flags = FLAGS[codes]
+    next_to = np.zeros(len(where), dtype=bool)
+    next_to[1:] = np.diff(where) == 1
+
+    candidate = (flags & FIRST) != 0
+    candidate[:-1] |= ((flags[:-1] & KEYCAP_START) != 0) & ((flags[1:] & KEYCAP_MARK) != 0) & next_to[1:]
+    joins = (flags & CONTINUATION) != 0
+    inside = candidate | joins
+    attached = np.zeros(len(codes), dtype=bool)
+    attached[1:] = joins[1:] & inside[:-1] & next_to[1:]
+
+    starts = np.flatnonzero(inside & ~attached)
+    breaks = np.append(np.flatnonzero(~attached), len(codes))
+    ends = breaks[np.searchsorted(breaks, starts, side='right')]
+    lengths = ends - starts
+
+    # Every run that starts with a candidate and is short enough to be one
+    # emoji, numbered by its code points: three code points (21 bits each)
+    # fit in an int64 word, and the words of longer runs are numbered in turn
+    whole = candidate[starts] & (lengths <= MAX_LENGTH)
+    run_starts = starts[whole]
+    run_lengths = lengths[whole]
+    last = max(len(codes) - 1, 0)
+    run_ids = np.zeros(len(run_starts), dtype=np.int64)
+    for offset in range(0, int(run_lengths.max(initial=0)), 3):
+        rows = np.flatnonzero(run_lengths > offset)
+        word = np.zeros(len(rows), dtype=np.int64)
+        for i in range(offset, offset + 3):
+            part = codes[np.minimum(run_starts[rows] + i, last)].astype(np.int64)
+            word = (word << 21) | np.where(i < run_lengths[rows], part, 0)
+        word_ids, words = pd.factorize(word)
+        ids, _ = pd.factorize(run_ids[rows] * len(words) + word_ids)
+        run_ids[rows] = ids + (run_ids.max() + 1 if offset else 0)
+    run_ids, _ = pd.factorize(run_ids)
+    count = int(run_ids.max(initial=-1)) + 1
+    first = np.zeros(count, dtype=np.int64)
+    first[run_ids[::-1]] = np.arange(len(run_ids))[::-1]
+    run_starts = where[run_starts]
+
+    names = []
+    known = np.zeros(count, dtype=bool)
+    for i, (pos, length) in enumerate(zip(run_starts[first].tolist(), run_lengths[first].tolist())):
+        names.append(text[pos:pos + length])
+        known[i] = names[-1] in emoji.EMOJI_DATA
+    matched = known[run_ids]
+
+    # Everything else, in order, as the regexes would see it
+    todo = np.ones(len(starts), dtype=bool)
+    todo[np.flatnonzero(whole)[matched]] = False
+    pending = np.zeros(len(codes) + 1, dtype=np.int64)
+    np.add.at(pending, starts[todo], 1)
+    np.add.at(pending, ends[todo], -1)
+    in_pending = np.cumsum(pending[:-1]) > 0
+
+    positions = []
+    found = []
+    end = 0
+    for pos in where[candidate & in_pending].tolist():
+        if pos < end:
+            continue
+        match = TAILS[text[pos]].match(text, pos + 1)
+        if match is None:
+            continue
+        end = match.end()
+        positions.append(pos)
+        found.append(text[pos:end])
+
+    # An emoji matched one by one may also have been found as a whole run
+    run_names = [name for name, ok in zip(names, known.tolist()) if ok]
+    found_ids, found_names = pd.factorize(pd.Series(found, dtype=object))
+    name_ids, names = pd.factorize(pd.Series(run_names + found_names.tolist(), dtype=object))
+    ids = np.concatenate([(np.cumsum(known) - 1)[run_ids[matched]], found_ids + len(run_names)]).astype(np.int64)
+    return (
+        np.concatenate([run_starts[matched], np.asarray(positions, dtype=np.int64)]),
+        name_ids[ids],
+        np.asarray(names, dtype=object),
+    )
+
+
+def _scan(text):
+    # Returns (start positions, emojis) for every emoji sequence in text, in
+    # the order they appear
+    positions, ids, names = _scan_codes(text)
+    order = np.argsort(positions, kind='stable')
+    return positions[order].tolist(), names[ids[order]].tolist()
+
+
+def find_emojis(text):
+    # Whole emoji sequences (ZWJ families, skin tones, flags, keycaps), not
+    # the single code points they are built from
+    return _scan(text)[1]
+
+
+@profiled()
+def count_emojis(messages, users=None):
+    # Without users: Series of emoji -> count, most used first.
+    # With users: Series indexed by (user, emoji), counted in the same pass.
+    messages = pd.Series(messages, copy=False)
+
+    # Every emoji contains at least one non-ASCII character
+    values = messages.to_numpy(dtype=object)
+    try:
+        rows = np.flatnonzero(~np.fromiter(map(str.isascii, values), dtype=bool, count=len(values)))
+    except TypeError:
+        # Missing messages (None, NaN) among the text
+        rows = np.array([i for i, m in enumerate(values) if type(m) is str and not m.isascii()], dtype=np.int64)
+    texts = values[rows]
+    positions, ids, names = _scan_codes('\n'.join(texts))
+
+    if users is None:
+        # Most used first; ties in order of first use
+        first = np.full(len(names), np.iinfo(np.int64).max)
+        np.minimum.at(first, ids, positions)
+        order = np.argsort(first, kind='stable')
+        counts = pd.Series(np.bincount(ids, minlength=len(names))[order], index=names[order], dtype=np.int64)
+        return counts.sort_values(ascending=False, kind='stable').rename_axis('Emoji').rename('Count')
+
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    starts = np.concatenate([[0], np.cumsum(lengths + 1)[:-1]]).astype(np.int64)
+    owner = rows[np.searchsorted(starts, positions, side='right') - 1]
+    table = pd.DataFrame({
+        'user': pd.Series(users, copy=False).to_numpy()[owner],
+        'Emoji': names[ids],
+    })
+    return table.groupby(['user', 'Emoji'], sort=True).size().rename('Count')
@@ -1,186 +1,209 @@
-from urlextract import URLExtract
-from wordcloud import WordCloud
+import hashlib
+import io
+import numpy as np
 import pandas as pd
-from collections import Counter
-import emoji
-
-extract = URLExtract()
-
+from chat_index import as_chat_index
+from tokens import STOP_WORDS_KEY
+import cache
+from memo import Fallback, memoize
+from profiling import profiled
+from preprocessor import DAY_NAME_DTYPE, MONTH_DTYPE
+
+@memoize()
+@profiled()
 def fetch_stats(selected_user, df):
     try:
-        if selected_user != 'Overall':
-            df = df[df['user'] == selected_user]
-
-        num_messages = df.shape[0]
-
-        # Fetch total number of words
-        words = []
-        for message in df['message']:
-            if isinstance(message, str):
-                words.extend(message.split())
-
-        # Fetch number of media messages
-        num_media_messages = df[df['message'].str.contains('<Media omitted>', na=False)].shape[0]
+        chat = as_chat_index(df)
 
-        # Fetch number of links shared
-        links = []
-        for message in df['message']:
-            if isinstance(message, str):
-                links.extend(extract.find_urls(message))
+        num_messages = chat.total(chat.message_counts.to_numpy(), selected_user)
+        words = chat.total(chat.word_totals, selected_user)
+        num_media_messages = chat.total(chat.media_totals, selected_user)
+        num_links = chat.total(chat.link_totals, selected_user)
 
-        return num_messages, len(words), num_media_messages, len(links)
+        return num_messages, words, num_media_messages, num_links
     except Exception as e:
         print(f"Error in fetch_stats: {e}")
-        return 0, 0, 0, 0
+        return Fallback((0, 0, 0, 0))
 
+@memoize()
+@profiled()
 def most_busy_users(df):
     try:
-        x = df['user'].value_counts().head()
-        df_percent = round((df['user'].value_counts() / df.shape[0]) * 100, 2).reset_index()
+        chat = as_chat_index(df)
+        counts = chat.message_counts.sort_values(ascending=False, kind='stable')
+        x = counts.head()
+        df_percent = round((counts / len(chat)) * 100, 2).reset_index()
         df_percent.columns = ['name', 'percent']
         return x, df_percent
     except Exception as e:
         print(f"Error in most_busy_users: {e}")
-        return pd.Series(), pd.DataFrame()
+        return Fallback((pd.Series(), pd.DataFrame()))
 
-def create_wordcloud(selected_user, df):
+def create_wordcloud(selected_user, df, width=500, height=500):
     try:
-        if selected_user != 'Overall':
-            df = df[df['user'] == selected_user]
-
-        # Filter messages
-        temp = df[df['user'] != 'group_notification']
-        temp = temp[~temp['message'].str.contains('<Media omitted>', na=False)]
-
-        # Load stop words
-        try:
-            with open('stop_hinglish.txt', 'r', encoding='utf-8') as f:
-                stop_words = set(f.read().splitlines())
-        except:
-            stop_words = set()
-
-        def remove_stop_words(message):
-            if not isinstance(message, str):
-                return ""
-            return " ".join([word for word in message.lower().split() if word not in stop_words])
-
-        wc = WordCloud(width=500, height=500, min_font_size=10, background_color='white')
-        temp['message'] = temp['message'].apply(remove_stop_words)
-        
-        if temp['message'].str.cat(sep=" ").strip():
-            return wc.generate(temp['message'].str.cat(sep=" "))
-        return None
+        chat = as_chat_index(df)
+        frequencies = chat.counts(chat.term_counts, selected_user, sort=False)
+        frequencies = frequencies[frequencies > 0]
+
+        if frequencies.empty:
+            return None
+        # Imported here: wordcloud pulls in matplotlib, which only chart
+        # rendering needs
+        from wordcloud import WordCloud
+        wc = WordCloud(width=width, height=height, min_font_size=10, background_color='white')
+        return wc.generate_from_frequencies(frequencies.to_dict())
     except Exception as e:
         print(f"Error in create_wordcloud: {e}")
         return None
 
+@memoize(spill=False)
+@profiled()
+def wordcloud_image(selected_user, df, width=500, height=500):
+    # PNG bytes of the word cloud, cached per chat, user, stop words and size
+    # so reruns skip the WordCloud layout step entirely
+    try:
+        chat = as_chat_index(df)
+        user_key = hashlib.blake2b(selected_user.encode('utf-8'), digest_size=8).hexdigest()
+        name = f"{chat.key}.wordcloud.{user_key}.{STOP_WORDS_KEY}.{width}x{height}.png"
+
+        png = cache.load_bytes(name)
+        if png is not None:
+            return png
+
+        wc = create_wordcloud(selected_user, chat, width, height)
+        if wc is None:
+            return None
+        buffer = io.BytesIO()
+        wc.to_image().save(buffer, format='PNG')
+        png = buffer.getvalue()
+        cache.store_bytes(name, png)
+        return png
+    except Exception as e:
+        print(f"Error in wordcloud_image: {e}")
+        return Fallback(None)
+
+@memoize()
+@profiled()
 def most_common_words(selected_user, df):
     try:
-        if selected_user != 'Overall':
-            df = df[df['user'] == selected_user]
-
-        # Load stop words
-        try:
-            with open('stop_hinglish.txt', 'r', encoding='utf-8') as f:
-                stop_words = set(f.read().splitlines())
-        except:
-            stop_words = set()
-
-        # Filter messages
-        temp = df[df['user'] != 'group_notification']
-        temp = temp[~temp['message'].str.contains('<Media omitted>', na=False)]
-
-        words = []
-        for message in temp['message']:
-            if isinstance(message, str):
-                words.extend([word for word in message.lower().split() if word not in stop_words])
-
-        return pd.DataFrame(Counter(words).most_common(20))
+        chat = as_chat_index(df)
+        counts = chat.counts(chat.term_counts, selected_user, sort=False)
+        counts = counts.sort_values(ascending=False, kind='stable').head(20)
+        return pd.DataFrame(list(counts.items()))
     except Exception as e:
         print(f"Error in most_common_words: {e}")
-        return pd.DataFrame()
+        return Fallback(pd.DataFrame())
 
+@memoize()
+@profiled()
 def emoji_helper(selected_user, df):
     try:
-        if selected_user != 'Overall':
-            df = df[df['user'] == selected_user]
-
-        emojis = []
-        for message in df['message']:
-            if isinstance(message, str):
-                emojis.extend([c for c in message if c in emoji.EMOJI_DATA])
-
-        emoji_dict = Counter(emojis)
-        if emoji_dict:
-            return pd.DataFrame(emoji_dict.most_common(), columns=['Emoji', 'Count'])
+        chat = as_chat_index(df)
+        counts = chat.counts(chat.emoji_counts, selected_user)
+        counts = counts[counts > 0].sort_values(ascending=False, kind='stable')
+        if not counts.empty:
+            return pd.DataFrame({'Emoji': counts.index, 'Count': counts.to_numpy()})
         return pd.DataFrame(columns=['Emoji', 'Count'])
     except Exception as e:
         print(f"Error in emoji_helper: {e}")
-        return pd.DataFrame()
-
-def monthly_timeline(selected_user, df):
+        return Fallback(pd.DataFrame())
+
+def _trim(counts):
+    # Drop the empty buckets before the first and after the last message
+    nonzero = np.flatnonzero(counts.to_numpy())
+    if len(nonzero) == 0:
+        return counts.iloc[:0]
+    return counts.iloc[nonzero[0]:nonzero[-1] + 1]
+
+@memoize(version=3)
+@profiled()
+def monthly_timeline(selected_user, df, tz=None, source_tz=None):
+    # One row per calendar month from the first to the last message, months
+    # without messages included as zeros
     try:
-        if selected_user != 'Overall':
-            df = df[df['user'] == selected_user]
-
-        timeline = df.groupby(['year', 'month']).count()['message'].reset_index()
-        timeline['time'] = timeline.apply(lambda x: f"{x['month']}-{x['year']}", axis=1)
+        chat = as_chat_index(df)
+        months = _trim(chat.bucket_counts('month', selected_user, tz, source_tz))
+        timeline = pd.DataFrame({
+            'year': months.index.year,
+            'month': pd.Categorical.from_codes(months.index.month - 1, dtype=MONTH_DTYPE),
+            'message': months.to_numpy(),
+        })
+        timeline['time'] = timeline['month'].astype(str) + '-' + timeline['year'].astype(str)
         return timeline
     except Exception as e:
         print(f"Error in monthly_timeline: {e}")
-        return pd.DataFrame()
+        return Fallback(pd.DataFrame())
 
-def daily_timeline(selected_user, df):
+@memoize(version=3)
+@profiled()
+def daily_timeline(selected_user, df, tz=None, source_tz=None):
+    # One row per day from the first to the last message, quiet days as zeros
     try:
-        if 'only_date' not in df.columns:
-            print("Missing 'only_date' column")
-            return pd.DataFrame()
-            
-        if selected_user != 'Overall':
-            df = df[df['user'] == selected_user]
-            
-        daily_timeline = df.groupby('only_date').count()['message'].reset_index()
-        return daily_timeline
+        chat = as_chat_index(df)
+        days = _trim(chat.bucket_counts('day', selected_user, tz, source_tz))
+        return pd.DataFrame({'only_date': days.index, 'message': days.to_numpy()})
     except Exception as e:
         print(f"Error in daily_timeline: {e}")
-        return pd.DataFrame()
+        return Fallback(pd.DataFrame())
 
-def week_activity_map(selected_user, df):
+@memoize()
+@profiled()
+def activity_timeline(selected_user, df, bucket='week', tz=None, source_tz=None):
+    # Messages per day, week, month, quarter or year, with a text label
     try:
-        if selected_user != 'Overall':
-            df = df[df['user'] == selected_user]
-        return df['day_name'].value_counts()
+        chat = as_chat_index(df)
+        counts = _trim(chat.bucket_counts(bucket, selected_user, tz, source_tz))
+        timeline = pd.DataFrame({'period': counts.index, 'message': counts.to_numpy()})
+        if bucket == 'week':
+            # Label weeks by their Monday
+            timeline['time'] = counts.index.start_time.strftime('%d %b %Y')
+        elif bucket == 'day':
+            timeline['time'] = counts.index.strftime('%Y-%m-%d')
+        else:
+            timeline['time'] = counts.index.astype(str)
+        return timeline
+    except Exception as e:
+        print(f"Error in activity_timeline: {e}")
+        return Fallback(pd.DataFrame())
+
+@memoize(version=2)
+@profiled()
+def week_activity_map(selected_user, df, tz=None, source_tz=None):
+    # Messages on each weekday, Monday to Sunday, quiet days as zeros
+    try:
+        chat = as_chat_index(df)
+        counts = chat.bucket_counts('weekday', selected_user, tz, source_tz)
+        counts.index = pd.CategoricalIndex(counts.index, dtype=DAY_NAME_DTYPE, name='day_name')
+        return counts.rename('count')
     except Exception as e:
         print(f"Error in week_activity_map: {e}")
-        return pd.Series()
+        return Fallback(pd.Series())
 
-def month_activity_map(selected_user, df):
+@memoize(version=2)
+@profiled()
+def month_activity_map(selected_user, df, tz=None, source_tz=None):
+    # Messages in each calendar month, January to December, quiet months as zeros
     try:
-        if selected_user != 'Overall':
-            df = df[df['user'] == selected_user]
-        return df['month'].value_counts()
+        chat = as_chat_index(df)
+        counts = chat.bucket_counts('month_of_year', selected_user, tz, source_tz)
+        counts.index = pd.CategoricalIndex(counts.index, dtype=MONTH_DTYPE, name='month')
+        return counts.rename('count')
     except Exception as e:
         print(f"Error in month_activity_map: {e}")
-        return pd.Series()
+        return Fallback(pd.Series())
 
-def activity_heatmap(selected_user, df):
+@memoize(version=2)
+@profiled()
+def activity_heatmap(selected_user, df, slot='hour', tz=None, source_tz=None):
+    # Weekday (Monday first) x time-of-day slot ('hour', 'slot30', 'slot15')
     try:
-        df_copy = df.copy()
-        
-        if selected_user != 'Overall':
-            df_copy = df_copy[df_copy['user'] == selected_user]
-        
-        df_copy.loc[:, 'period'] = df_copy['message_date'].dt.hour
-
-        user_heatmap = df_copy.pivot_table(
-            index='day_name', 
-            columns='period',
-            values='message',
-            aggfunc='count'
-        ).fillna(0)
-        
-        return user_heatmap
-    
+        chat = as_chat_index(df)
+        counts = chat.bucket_matrix('weekday', slot, selected_user, tz, source_tz)
+        counts.columns.name = 'period'
+
+        # Keep only the days and slots that actually have messages
+        values = counts.to_numpy()
+        return counts.loc[values.sum(axis=1) > 0, values.sum(axis=0) > 0].astype(float)
     except Exception as e:
         print(f"Error in activity_heatmap: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return Fallback(pd.DataFrame())
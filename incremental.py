@@ -0,0 +1,220 @@
+import codecs
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import preprocessor
+import sentiment
+import cache
+from profiling import profiled
+from chat_index import ChatIndex
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Every export ingested so far: content hash, size in bytes and a hash of the
+# first HEAD_SIZE bytes, which rules out unrelated chats without reading them
+REGISTRY_PATH = cache.CACHE_DIR / 'exports.json'
+REGISTRY_LOCK_PATH = cache.CACHE_DIR / 'exports.json.lock'
+REGISTRY_LIMIT = 500
+HEAD_SIZE = 1 << 16
+
+# Without a disk cache the registry lives in memory for this process only
+_registry = []
+_registry_lock = threading.Lock()
+
+# Recently ingested chats kept in memory so their computed tables can be
+# carried over without going through disk
+RECENT_LIMIT = 4
+_recent = OrderedDict()
+
+
+def _load_registry():
+    if not cache.ENABLED:
+        return list(_registry)
+    try:
+        with open(REGISTRY_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except OSError:
+        return []
+    except ValueError as e:
+        print(f"Error reading export registry: {e}")
+        return []
+
+
+@contextmanager
+def _locked_registry():
+    # The registry is read, changed and rewritten by every process that
+    # ingests a chat (batch.py -j runs several); this serialises them
+    with _registry_lock:
+        if not cache.ENABLED:
+            yield
+            return
+        REGISTRY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(REGISTRY_LOCK_PATH, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _register(key, size, head_hash):
+    try:
+        with _locked_registry():
+            entries = [e for e in _load_registry() if e['key'] != key]
+            entries.append({'key': key, 'size': size, 'head': head_hash})
+            entries = entries[-REGISTRY_LIMIT:]
+            if not cache.ENABLED:
+                _registry[:] = entries
+                return
+            # A temporary file of its own, so writers never share one
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=REGISTRY_PATH.parent,
+                                             prefix='exports.', suffix='.tmp', delete=False) as f:
+                json.dump(entries, f)
+            os.replace(f.name, REGISTRY_PATH)
+    except OSError as e:
+        print(f"Error updating export registry: {e}")
+
+
+def _remember(chat):
+    _recent[chat.key] = chat
+    _recent.move_to_end(chat.key)
+    while len(_recent) > RECENT_LIMIT:
+        _recent.popitem(last=False)
+
+
+def _prefix_hash(source, size):
+    digest = hashlib.blake2b(digest_size=20)
+    position = source.tell()
+    remaining = size
+    while remaining > 0:
+        chunk = source.read(min(cache.HASH_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        digest.update(chunk)
+        remaining -= len(chunk)
+    source.seek(position)
+    return digest.hexdigest()
+
+
+def find_prefix(source, size, head_hash):
+    # Longest previously ingested export whose bytes are a strict prefix of
+    # this one, or None
+    candidates = [e for e in _load_registry() if e['size'] < size and e['head'] == head_hash]
+    for entry in sorted(candidates, key=lambda e: e['size'], reverse=True):
+        if _prefix_hash(source, entry['size']) == entry['key']:
+            return entry
+    return None
+
+
+def _decode_tail(head, tail_bytes):
+    encoding = preprocessor._detect_encoding(head)
+    if encoding == 'utf-16':
+        # The BOM only exists at the start of the file
+        encoding = 'utf-16-be' if head.startswith(codecs.BOM_UTF16_BE) else 'utf-16-le'
+    return tail_bytes.decode(encoding)
+
+
+def _load_base(key):
+    if key in _recent:
+        return _recent[key]
+    df = cache.load_frame(key)
+    if df is None:
+        return None
+    return ChatIndex(df, key)
+
+
+@profiled()
+def ingest(source, key=None):
+    # ChatIndex for the export in `source` (bytes or a binary file object).
+    # An export seen before is loaded from the cache; one that extends an
+    # earlier export only has its new messages parsed and analysed; anything
+    # else is parsed from scratch. None when no messages could be extracted.
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    source.seek(0)
+
+    if key is None:
+        key = cache.content_hash(source)
+    if key in _recent:
+        return _recent[key]
+
+    head = source.read(HEAD_SIZE)
+    size = source.seek(0, io.SEEK_END)
+    source.seek(0)
+    head_hash = hashlib.blake2b(head, digest_size=20).hexdigest()
+
+    chat = None
+    df = cache.load_frame(key)
+    if df is not None:
+        chat = ChatIndex(df, key)
+    else:
+        entry = find_prefix(source, size, head_hash)
+        base = _load_base(entry['key']) if entry is not None else None
+        if base is not None:
+            try:
+                chat = extend(base, source, entry['size'], head, key)
+            except Exception as e:
+                print(f"Error in extend: {e}")
+                chat = None
+
+    if chat is None:
+        df = preprocessor.preprocess_stream(source)
+        if df.empty:
+            return None
+        chat = ChatIndex(df, key)
+        cache.store_frame(key, df)
+
+    _register(key, size, head_hash)
+    _remember(chat)
+    return chat
+
+
+@profiled()
+def extend(base, source, offset, head, key):
+    # Parse the bytes after `offset` and append them to `base`, or return
+    # None when they do not start with a new message
+    source.seek(offset)
+    tail_text = _decode_tail(head, source.read())
+    source.seek(0)
+
+    if tail_text.strip() and not preprocessor.PATTERN.match(tail_text.lstrip('\r\n')):
+        return None
+
+    tail = preprocessor.preprocess_stream(tail_text, date_format=base.df.attrs.get('date_format'))
+    if tail.empty:
+        return ChatIndex(base.df, key) if not tail_text.strip() else None
+
+    # Pull in what earlier runs left on disk so it is carried over too
+    sentiment.cached_scores(base)
+    base.load_stored()
+    chat = base.append(tail, key)
+    chat.store_computed()
+
+    if base.sentiment_scores is not None:
+        tail_index = ChatIndex(tail)
+        tail_scores = sentiment.score_messages(tail['message'], skip=~tail_index.text_mask)
+        chat.sentiment_scores = np.concatenate([base.sentiment_scores, tail_scores])
+        cache.store_array(sentiment.scores_name(key), chat.sentiment_scores)
+
+    cache.store_frame(key, chat.df)
+    print(f"Appended {len(tail)} new messages to {len(base)} already ingested")
+    return chat
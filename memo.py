@@ -0,0 +1,187 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import threading
+from collections import OrderedDict
+import pandas as pd
+from chat_index import as_chat_index
+import cache
+
+# Results of the analysis functions, keyed by (function, chat fingerprint,
+# arguments). Streamlit reruns the whole script on every interaction, so
+# switching users or pressing "Analyze Chat" again only looks results up.
+MAX_ENTRIES = int(os.environ.get('CHAT_MEMO_ENTRIES', 2048))
+MAX_BYTES = int(os.environ.get('CHAT_MEMO_MAX_BYTES', 256 * 1024 ** 2))
+
+# Entries pushed out of memory are pickled into the chat cache directory
+# (and evicted from there with everything else) unless this is turned off
+SPILL = os.environ.get('CHAT_MEMO_SPILL', '1') != '0'
+
+stats = {'hits': 0, 'misses': 0, 'spilled': 0, 'spill_hits': 0}
+
+_entries = OrderedDict()
+# Whether a memoized call failed somewhere below the current one, per thread
+_local = threading.local()
+_sizes = {}
+_total_bytes = 0
+_lock = threading.Lock()
+
+
+def _size(value):
+    # In-memory footprint, enough to keep the LRU within MAX_BYTES. deep
+    # counts the strings of object columns; Arrow columns report their buffers.
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_size(v) for v in value)
+    return 64
+
+
+def _share(value):
+    # Callers get their own shallow copy, so renaming or adding columns does
+    # not change what later reruns see
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_share(v) for v in value)
+    return value
+
+
+def _spill_name(key):
+    name, version, chat_key, args = key
+    arg_hash = hashlib.blake2b(repr(args).encode('utf-8'), digest_size=8).hexdigest()
+    return f"{chat_key}.memo.{name}.v{version}.{arg_hash}.pkl"
+
+
+def _put(key, value, spill):
+    global _total_bytes
+    size = _size(value)
+    evicted = []
+    with _lock:
+        if key in _entries:
+            _total_bytes -= _sizes.pop(key)
+            del _entries[key]
+        _entries[key] = (value, spill)
+        _sizes[key] = size
+        _total_bytes += size
+        while len(_entries) > 1 and (len(_entries) > MAX_ENTRIES or _total_bytes > MAX_BYTES):
+            old_key, (old_value, old_spill) = _entries.popitem(last=False)
+            _total_bytes -= _sizes.pop(old_key)
+            if old_spill:
+                evicted.append((old_key, old_value))
+
+    # Pickling happens outside the lock
+    for old_key, old_value in evicted:
+        if not cache.ENABLED:
+            break
+        try:
+            if cache.store_bytes(_spill_name(old_key), pickle.dumps(old_value, protocol=pickle.HIGHEST_PROTOCOL)):
+                stats['spilled'] += 1
+        except Exception as e:
+            print(f"Error spilling {old_key[0]} result: {e}")
+
+
+def _get(key, spill):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            stats['hits'] += 1
+            return True, entry[0]
+
+    if spill:
+        data = cache.load_bytes(_spill_name(key))
+        if data is not None:
+            try:
+                value = pickle.loads(data)
+            except Exception as e:
+                print(f"Error reading spilled {key[0]} result: {e}")
+            else:
+                stats['spill_hits'] += 1
+                _put(key, value, spill)
+                return True, value
+
+    stats['misses'] += 1
+    return False, None
+
+
+class Fallback:
+    # What a memoized function returns from its `except` block. The caller
+    # gets `value`, but neither it nor any memoized call that used it is
+    # cached, so a transient error is retried on the next call.
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def _unwrap(value):
+    if isinstance(value, Fallback):
+        _local.failed = True
+        return value.value
+    return value
+
+
+def memoize(version=1, ignore=(), spill=True):
+    # Caches an analysis function taking the chat as `df` (a DataFrame or
+    # ChatIndex). The key is the chat fingerprint plus every other argument
+    # except those in `ignore` (callbacks and the like). Bump `version` when
+    # the function's output changes so spilled results are not reused.
+    def decorate(func):
+        signature = inspect.signature(func)
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            try:
+                chat = as_chat_index(bound.arguments['df'])
+            except Exception:
+                # Not a chat frame; let the function report it as usual
+                return _unwrap(func(*args, **kwargs))
+            bound.arguments['df'] = chat
+
+            arguments = tuple(
+                (k, v) for k, v in bound.arguments.items() if k != 'df' and k not in ignore
+            )
+            # Results derive from the frame layout too
+            key = (name, f"{version}.{cache.FRAME_VERSION}", chat.key, arguments)
+            use_disk = spill and SPILL
+
+            found, value = _get(key, use_disk)
+            if not found:
+                outer = getattr(_local, 'failed', False)
+                _local.failed = False
+                try:
+                    value = _unwrap(func(*bound.args, **bound.kwargs))
+                    failed = _local.failed
+                finally:
+                    _local.failed = outer or _local.failed
+                if failed:
+                    return value
+                _put(key, value, use_disk)
+            return _share(value)
+
+        wrapper.uncached = lambda *args, **kwargs: _unwrap(func(*args, **kwargs))
+        return wrapper
+    return decorate
+
+
+def clear():
+    global _total_bytes
+    with _lock:
+        _entries.clear()
+        _sizes.clear()
+        _total_bytes = 0
+
+
+def memo_stats():
+    with _lock:
+        return dict(stats, entries=len(_entries), bytes=_total_bytes)
@@ -0,0 +1,41 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# Process pools for the CPU-bound passes over messages (link extraction,
+# sentiment scoring) and for chart drawing. Processes are spawned, not
+# forked: the app server is multithreaded and forking it can deadlock on a
+# lock another thread holds.
+
+MAX_PROCESSES = int(os.environ.get('CHAT_MAX_PROCESSES', 4))
+# Below this many messages a pass runs in the calling process; starting the
+# workers would cost more than it saves
+PARALLEL_MIN_MESSAGES = 20_000
+
+
+def process_count(messages, processes=None):
+    # Worker processes for a pass over `messages` messages; 1 means no pool
+    if messages < PARALLEL_MIN_MESSAGES:
+        return 1
+    return max(1, min(processes or os.cpu_count() or 1, MAX_PROCESSES))
+
+
+def spawn_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+
+
+def once(build):
+    # Function returning build()'s result, built on first call and only once
+    # per process, so importing a module that needs a heavy object stays cheap
+    value = None
+    lock = threading.Lock()
+
+    def get():
+        nonlocal value
+        if value is None:
+            with lock:
+                if value is None:
+                    value = build()
+        return value
+    return get
@@ -1,71 +1,303 @@
+import codecs
+import io
+import os
 import re
+import numpy as np
 import pandas as pd
+from profiling import profiled
 
-def preprocess(data):
+PATTERN = re.compile(
+    r'(\d{1,2}/\d{1,2}/\d{2,4}),\s(\d{1,2}:\d{2}(?::\d{2})?)\s?(AM|PM|am|pm)?\s-\s(.*?)(?=\n\d{1,2}/\d{1,2}/\d{2}|\Z)',
+    re.DOTALL
+)
+
+# A message can only end right before a newline followed by a date, so the
+# text is always cut there and PATTERN never sees half a message.
+BOUNDARY = re.compile(r'\n(?=\d{1,2}/\d{1,2}/\d{2})')
+
+USER_SPLIT = re.compile(r'([^:]+?):\s')
+
+DATE_FORMATS = ['%d/%m/%y', '%d/%m/%Y', '%m/%d/%y', '%m/%d/%Y']
+TIME_FORMATS = ['%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M:%S %p']
+DATETIME_FORMATS = [f'{d}, {t}' for d in DATE_FORMATS for t in TIME_FORMATS]
+
+# Dates and times are only sampled for the time layout; the day/month order
+# is decided from every distinct date, which is cheap (one per chat day)
+DATE_SAMPLE_SIZE = 2000
+
+CHUNK_SIZE = 1 << 20
+BATCH_SIZE = 200_000
+
+# Derived columns are stored compactly: month and weekday names as
+# categoricals over fixed, calendar-ordered categories (so batches concatenate
+# without widening), small integers for the time parts and midnight
+# timestamps instead of datetime.date objects for the day.
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTH_DTYPE = pd.CategoricalDtype(MONTH_NAMES)
+DAY_NAME_DTYPE = pd.CategoricalDtype(DAY_NAMES)
+
+# Message text is kept in Arrow-backed strings when pyarrow is available,
+# which is several times smaller than Python str objects
+try:
+    import pyarrow  # noqa: F401
+    ARROW_STRINGS = os.environ.get('CHAT_ARROW_STRINGS', '1') != '0'
+except ImportError:
+    ARROW_STRINGS = False
+
+
+def _detect_encoding(head):
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'utf-16'
+
+
+def _open_text(source):
+    # Accepts the decoded text, raw bytes, a path or a binary file object
+    # (e.g. a Streamlit upload) and returns (text stream, owns binary stream)
+    if isinstance(source, str):
+        return io.StringIO(source), False
+    if isinstance(source, io.TextIOBase):
+        return source, False
+
+    owned = False
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+        owned = True
+    elif isinstance(source, os.PathLike):
+        source = open(source, 'rb')
+        owned = True
+
+    position = source.tell()
+    head = source.read(1 << 16)
+    source.seek(position)
+    encoding = _detect_encoding(head)
+    # newline='' keeps '\r\n' untouched, exactly like bytes.decode()
+    return io.TextIOWrapper(source, encoding=encoding, newline=''), owned
+
+
+def _iter_segments(stream, chunk_size):
+    carry = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buf = carry + chunk
+
+        # Boundaries inside the old carry were already ruled out, except the
+        # last few characters whose lookahead may have been cut off
+        cut = None
+        for match in BOUNDARY.finditer(buf, max(1, len(carry) - 16)):
+            cut = match.start()
+
+        if cut is None:
+            carry = buf
+        else:
+            yield buf[:cut]
+            carry = buf[cut:]
+    if carry:
+        yield carry
+
+
+def describe_date_format(date_format):
+    order = 'US month-first' if date_format.startswith('%m') else 'day-first'
+    clock = '12-hour' if '%p' in date_format else '24-hour'
+    return f"{date_format} ({order}, {clock})"
+
+
+def date_order(dates):
+    # '%d/%m' or '%m/%d' once some date rules the other order out, None while
+    # every date reads both ways
+    day_first = month_first = False
+    for date in pd.unique(pd.Series(dates, dtype=object)):
+        first, second, _ = date.split('/')
+        if int(first) > 12:
+            day_first = True
+        if int(second) > 12:
+            month_first = True
+    if month_first and not day_first:
+        return '%m/%d'
+    if day_first:
+        return '%d/%m'
+    return None
+
+
+def detect_date_format(dates, times, ampm):
+    # Returns every candidate in DATETIME_FORMATS, most likely first
+    long_year = any(len(date.rsplit('/', 1)[1]) == 4 for date in pd.unique(dates))
+
+    step = max(1, len(times) // DATE_SAMPLE_SIZE)
+    time_sample = times.iloc[::step]
+    seconds = time_sample.str.count(':').gt(1).mean() > 0.5
+    twelve_hour = ampm.iloc[::step].ne('').mean() > 0.5
+
+    order = date_order(dates) or '%d/%m'
+    date_format = f"{order}/{'%Y' if long_year else '%y'}"
+    time_format = ('%I:%M:%S %p' if seconds else '%I:%M %p') if twelve_hour else ('%H:%M:%S' if seconds else '%H:%M')
+
+    best = f'{date_format}, {time_format}'
+    return [best] + [f for f in DATETIME_FORMATS if f != best]
+
+
+def _build_frame(matches, date_format=None):
+    df = pd.DataFrame(matches, columns=['date', 'time', 'ampm', 'user_message'])
+
+    message_date = df['date'] + ', ' + df['time']
+    has_ampm = df['ampm'] != ''
+    if has_ampm.any():
+        message_date = message_date.where(~has_ampm, message_date + ' ' + df['ampm'])
+
+    if date_format is not None:
+        # Other layouts keep the known day/month order first, so a batch with
+        # a different time layout is not read with day and month swapped
+        others = [f for f in DATETIME_FORMATS if f != date_format]
+        formats = [date_format] + sorted(others, key=lambda f: f[:5] != date_format[:5])
+    else:
+        formats = detect_date_format(df['date'], df['time'], df['ampm'])
+
+    # Normally the first candidate parses and the column is read only once
+    for fmt in formats:
+        try:
+            df['message_date'] = pd.to_datetime(message_date, format=fmt)
+            date_format = fmt
+            break
+        except ValueError:
+            continue
+
+    if 'message_date' not in df.columns:
+        print("Sample date values:", message_date.head().tolist())
+        raise ValueError("Could not parse dates with any known format")
+
+    add_date_columns(df)
+
+    users, messages = split_user_message(df['user_message'].str.strip())
+    df['user'] = pd.Categorical(users)
+    df['message'] = pd.array(messages, dtype='string[pyarrow]') if ARROW_STRINGS else messages
+    df.drop(columns=['date', 'time', 'ampm', 'user_message'], inplace=True)
+    df.attrs['date_format'] = date_format
+
+    return df, date_format
+
+
+def add_date_columns(df):
+    # Calendar parts of message_date, in the compact layout described above
+    dates = df['message_date'].dt
+    df['only_date'] = dates.normalize()
+    df['year'] = dates.year.astype(np.int16)
+    df['month'] = pd.Categorical.from_codes(dates.month.to_numpy() - 1, dtype=MONTH_DTYPE)
+    df['day'] = dates.day.astype(np.int8)
+    df['hour'] = dates.hour.astype(np.int8)
+    df['minute'] = dates.minute.astype(np.int8)
+    df['day_name'] = pd.Categorical.from_codes(dates.dayofweek.to_numpy(), dtype=DAY_NAME_DTYPE)
+    return df
+
+
+def split_user_message(user_message):
+    # One pass over the column. Nearly every line is "user: text" with no
+    # colon before the separator, which partition() resolves directly; only
+    # the remaining lines need USER_SPLIT, and they get the same result as
+    # re.split(USER_SPLIT, message, maxsplit=1) on every line would give.
+    users = []
+    msgs = []
+    add_user = users.append
+    add_msg = msgs.append
+
+    for message in user_message:
+        head, sep, tail = message.partition(': ')
+        if sep and head and ':' not in head:
+            add_user(head.strip())
+            add_msg(tail.strip())
+            continue
+
+        entry = USER_SPLIT.split(message, maxsplit=1)
+        if len(entry) > 2:
+            add_user(entry[1].strip())
+            add_msg(entry[2].strip())
+        else:
+            add_user('group_notification')
+            add_msg(entry[0].strip())
+
+    return users, msgs
+
+
+def iter_preprocess(source, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, date_format=None):
+    # Yields DataFrame batches of at most ~batch_size messages while reading
+    # the export incrementally, so only one chunk of raw text is held at once
+    # date_format skips detection, e.g. when parsing the tail of a chat whose
+    # format is already known. Without it the day/month order is settled
+    # before anything is parsed: batches whose dates all read both ways (no
+    # day past the 12th yet) are held back as raw matches until a later batch
+    # decides the order or the export ends, then parsed with that format.
+    stream, owned = _open_text(source)
+    try:
+        batch = []
+        held = []
+        for segment in _iter_segments(stream, chunk_size):
+            batch.extend(PATTERN.findall(segment))
+            if len(batch) >= batch_size:
+                if date_format is None and date_order([m[0] for m in batch]) is None:
+                    held.append(batch)
+                    batch = []
+                    continue
+                df, date_format = _build_frame(batch, date_format)
+                batch = []
+                for matches in held:
+                    yield _build_frame(matches, date_format)[0]
+                held = []
+                yield df
+        # The last batch may be the one that decides, so it is parsed first
+        last = None
+        if batch:
+            last, date_format = _build_frame(batch, date_format)
+        for matches in held:
+            df, date_format = _build_frame(matches, date_format)
+            yield df
+        if last is not None:
+            yield last
+        if date_format is not None:
+            print(f"Successfully parsed dates with format: {describe_date_format(date_format)}")
+    finally:
+        # Never close a buffer that belongs to the caller
+        if isinstance(stream, io.TextIOWrapper):
+            binary = stream.detach()
+            if owned:
+                binary.close()
+
+
+def concat_frames(frames):
+    # pd.concat() turns categoricals with different categories into object
+    # columns, so the user categories are unified (and kept sorted) first
+    if len(frames) == 1:
+        return frames[0]
+    users = pd.Index(sorted(set().union(*(f['user'].cat.categories for f in frames))))
+    frames = [f.assign(user=f['user'].cat.set_categories(users)) for f in frames]
+    df = pd.concat(frames, ignore_index=True)
+    df.attrs = dict(frames[0].attrs)
+    return df
+
+
+@profiled('parse')
+def preprocess_stream(source, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, date_format=None):
     try:
-        pattern = r'(\d{1,2}/\d{1,2}/\d{2,4}),\s(\d{1,2}:\d{2})(?::\d{2})?\s?(?:AM|PM|am|pm)?\s-\s(.*?)(?=\n\d{1,2}/\d{1,2}/\d{2}|\Z)'
-        
-        matches = re.findall(pattern, data, re.DOTALL)
-        
-        if not matches:
+        batches = list(iter_preprocess(source, chunk_size, batch_size, date_format))
+
+        if not batches:
             print("No messages found with the supported pattern")
             return pd.DataFrame()
-            
-        processed_data = []
-        for date, time, message in matches:
-            datetime_str = f"{date}, {time}"
-            processed_data.append([datetime_str, message.strip()])
-                
-        df = pd.DataFrame(processed_data, columns=['message_date', 'user_message'])
-        
-        datetime_formats = [
-            '%d/%m/%y, %H:%M',
-            '%d/%m/%Y, %H:%M',
-            '%m/%d/%y, %H:%M',  
-            '%m/%d/%Y, %H:%M'  
-        ]
-
-        for date_format in datetime_formats:
-            try:
-                df['message_date'] = pd.to_datetime(df['message_date'], format=date_format)
-                df['only_date'] = df['message_date'].dt.date
-                print(f"Successfully parsed dates with format: {date_format}")
-                break
-            except ValueError:
-                continue
-        
-        if 'only_date' not in df.columns:
-            print("Could not parse dates with any known format")
-            print("Sample date values:", df['message_date'].head().tolist())
-            return pd.DataFrame()
 
-        df['year'] = df['message_date'].dt.year
-        df['month'] = df['message_date'].dt.strftime('%B')
-        df['day'] = df['message_date'].dt.day
-        df['hour'] = df['message_date'].dt.hour
-        df['minute'] = df['message_date'].dt.minute
-        df['day_name'] = df['message_date'].dt.day_name()
-        
-        users = []
-        msgs = []
-        
-        for message in df['user_message']:
-            entry = re.split(r'([^:]+?):\s', message, maxsplit=1)
-            if len(entry) > 2:
-                users.append(entry[1].strip())
-                msgs.append(entry[2].strip())
-            else:
-                users.append('group_notification')
-                msgs.append(entry[0].strip())
-                
-        df['user'] = users
-        df['message'] = msgs
-        df.drop(columns=['user_message'], inplace=True)
-        
-        return df
+        return concat_frames(batches)
 
     except Exception as e:
         print(f"Error in preprocessing: {str(e)}")
         import traceback
         traceback.print_exc()
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+
+def preprocess(data):
+    return preprocess_stream(data)
@@ -0,0 +1,216 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+import pandas as pd
+
+# Timings of the pipeline stages (parsing, per-chat passes, helpers,
+# sentiment) for the app's Performance panel and for JSON reports.
+# Each stage records wall time, rows processed and, when memory tracking is
+# on, the peak Python allocation while it ran. Stages nest: a helper that
+# triggers link counting records both, the inner one with `parent` set.
+
+MAX_RECORDS = 2000
+
+_records = deque(maxlen=MAX_RECORDS)
+_records_lock = threading.Lock()
+_local = threading.local()
+
+# tracemalloc's peak is process-wide, so a stage's peak only means something
+# while no other thread is inside a stage (charts and progressive mode run
+# stages in parallel). Threads with an open stage are counted, and the epoch
+# moves on whenever stages start to overlap; a stage that saw either gets no
+# memory figure and never resets the peak under another thread.
+_threads_lock = threading.Lock()
+_active_threads = 0
+_overlap_epoch = 0
+
+
+def memory_tracking():
+    return tracemalloc.is_tracing()
+
+
+def track_memory(enabled=True):
+    # tracemalloc slows allocation-heavy code noticeably, so it is opt-in;
+    # peaks are process-wide, so concurrent sessions can inflate each other
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+if os.environ.get('CHAT_PROFILE_MEMORY', '0') != '0':
+    track_memory()
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def stage(name, rows=None, **details):
+    # Times the block as one stage. Set record['rows'] inside the block when
+    # the row count is only known at the end.
+    global _active_threads, _overlap_epoch
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    record = {'stage': name, 'parent': parent['stage'] if parent else None, 'rows': rows, **details}
+
+    with _threads_lock:
+        if parent is None:
+            _active_threads += 1
+            if _active_threads > 1:
+                _overlap_epoch += 1
+        alone = _active_threads == 1
+        epoch = _overlap_epoch
+
+    tracing = tracemalloc.is_tracing() and alone
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if parent is not None:
+            # The parent's peak so far would be lost by the reset below
+            parent['_peak'] = max(parent.get('_peak', 0), peak)
+        tracemalloc.reset_peak()
+        record['_base'] = current
+
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        record['seconds'] = elapsed
+        record['finished'] = time.time()
+
+        with _threads_lock:
+            overlapped = not alone or epoch != _overlap_epoch
+            if parent is None:
+                _active_threads -= 1
+        if overlapped and parent is not None:
+            # The enclosing stage shared the process with another thread too
+            parent['_overlapped'] = True
+        overlapped = overlapped or record.pop('_overlapped', False)
+        record['overlapped'] = overlapped
+
+        if tracing and not overlapped and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], record.pop('_peak', 0))
+            record['peak_bytes'] = max(peak - record.pop('_base'), 0)
+            if parent is not None:
+                parent['_peak'] = max(parent.get('_peak', 0), peak)
+        else:
+            record.pop('_base', None)
+            record.pop('_peak', None)
+            record['peak_bytes'] = None
+
+        if record['rows'] is not None and elapsed > 0:
+            record['rows_per_second'] = record['rows'] / elapsed
+        else:
+            record['rows_per_second'] = None
+
+        with _records_lock:
+            _records.append(record)
+
+
+def _rows(arguments, result):
+    # Messages the call worked on: the selected member's rows when there is a
+    # chat and a user, the whole chat otherwise, or the rows it returned
+    chat = arguments.get('df')
+    if chat is not None and hasattr(chat, 'rows'):
+        user = arguments.get('selected_user', 'Overall')
+        try:
+            rows = chat.rows(user)
+        except KeyError:
+            return 0
+        return len(chat) if rows is None else len(rows)
+    if chat is not None and hasattr(chat, '__len__'):
+        return len(chat)
+    for name in ('messages', 'source'):
+        value = arguments.get(name)
+        if isinstance(value, (pd.Series, list)):
+            return len(value)
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(getattr(result, 'df', None), pd.DataFrame):
+        return len(result.df)
+    return None
+
+
+def profiled(name=None):
+    # Decorator form of stage(); the row count is taken from the chat or
+    # messages argument, or from the returned frame
+    def decorate(func):
+        signature = inspect.signature(func)
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            details = {}
+            # Records are shared by every session (and downloadable from the
+            # app), so they say whether a call was for one member, never who
+            if isinstance(bound.arguments.get('selected_user'), str):
+                details['scope'] = 'overall' if bound.arguments['selected_user'] == 'Overall' else 'member'
+            with stage(stage_name, **details) as record:
+                result = func(*args, **kwargs)
+                record['rows'] = _rows(bound.arguments, result)
+            return result
+        return wrapper
+    return decorate
+
+
+def records():
+    with _records_lock:
+        return list(_records)
+
+
+def reset():
+    with _records_lock:
+        _records.clear()
+
+
+def summary(recorded=None):
+    # One row per stage: calls, total/mean/max seconds, rows, rows/s, peak memory
+    recorded = records() if recorded is None else recorded
+    columns = ['stage', 'calls', 'total_seconds', 'mean_seconds', 'max_seconds', 'rows', 'rows_per_second', 'peak_mb']
+    if not recorded:
+        return pd.DataFrame(columns=columns)
+
+    frame = pd.DataFrame(recorded)
+    for column in ('rows', 'peak_bytes'):
+        frame[column] = pd.to_numeric(frame.get(column), errors='coerce')
+    grouped = frame.groupby('stage', sort=False)
+    table = pd.DataFrame({
+        'calls': grouped.size(),
+        'total_seconds': grouped['seconds'].sum(),
+        'mean_seconds': grouped['seconds'].mean(),
+        'max_seconds': grouped['seconds'].max(),
+        'rows': grouped['rows'].sum(min_count=1),
+        'peak_mb': grouped['peak_bytes'].max() / 1e6,
+    })
+    table['rows_per_second'] = table['rows'] / table['total_seconds']
+    table = table.sort_values('total_seconds', ascending=False, kind='stable').reset_index()
+    return table[columns]
+
+
+def report():
+    # Everything recorded so far as plain JSON-serialisable data
+    recorded = records()
+    stages = summary(recorded).astype(object).where(lambda t: t.notna(), None)
+    return {
+        'memory_tracking': memory_tracking(),
+        'stages': stages.to_dict(orient='records'),
+        'records': [dict(r) for r in recorded],
+    }
+
+
+def write_report(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report(), f, indent=2, default=str)
@@ -1,32 +1,143 @@
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
+import os
+from pathlib import Path
+import numpy as np
 import pandas as pd
+from chat_index import as_chat_index
+import cache
+import pools
+from memo import Fallback, memoize
+from profiling import profiled
 
-# Initialize VADER once
-sia = SentimentIntensityAnalyzer()
+# The VADER lexicon is looked up in the nltk_data folder next to this file
+# first (filled by setup.sh), then in nltk's usual locations. Nothing is
+# downloaded at run time.
+NLTK_DATA_DIR = Path(os.environ.get('CHAT_NLTK_DATA', Path(__file__).with_name('nltk_data')))
 
-def analyze_sentiment(df, selected_user='Overall'):
-    try:
-        # Filter by user if needed
-        if selected_user != 'Overall':
-            df = df[df['user'] == selected_user]
 
-        # Copy to avoid changing original DataFrame
-        df_copy = df.copy()
-        df_copy['message'] = df_copy['message'].astype(str)
+def _build_analyzer():
+    import nltk
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    if str(NLTK_DATA_DIR) not in nltk.data.path:
+        nltk.data.path.insert(0, str(NLTK_DATA_DIR))
+    return SentimentIntensityAnalyzer()
+
+
+# VADER is built on first use, once per process, so importing this module
+# (and every Streamlit rerun) stays cheap
+get_analyzer = pools.once(_build_analyzer)
+
+SENTIMENT_LABELS = np.array(['Negative', 'Neutral', 'Positive'], dtype=object)
+
+# Sampled preview (sample_sentiment): share of each member's text messages
+# scored, with a floor for quiet members and a cap on the total
+SAMPLE_FRACTION = 0.05
+SAMPLE_MIN_PER_MEMBER = 30
+SAMPLE_MAX_MESSAGES = 20_000
+
+# Bump whenever scoring changes so cached scores are recomputed
+SCORES_VERSION = 2
+
+CHUNK_SIZE = 5_000
+
+
+def _score_chunk(texts):
+    sia = get_analyzer()
+    return [sia.polarity_scores(text)['compound'] for text in texts]
+
+
+def _score_texts(texts, processes=None, progress=None):
+    total = len(texts)
+    chunks = [texts[i:i + CHUNK_SIZE] for i in range(0, total, CHUNK_SIZE)]
+    workers = pools.process_count(total, processes)
+
+    scores = []
+    if workers > 1:
+        with pools.spawn_pool(workers) as pool:
+            for chunk_scores in pool.map(_score_chunk, chunks):
+                scores.extend(chunk_scores)
+                if progress is not None:
+                    progress(len(scores), total)
+    else:
+        for chunk in chunks:
+            scores.extend(_score_chunk(chunk))
+            if progress is not None:
+                progress(len(scores), total)
+
+    return np.array(scores, dtype=np.float64)
+
+
+@profiled()
+def score_messages(messages, processes=None, progress=None, skip=None):
+    # VADER compound score per message. Each distinct text is scored once
+    # (chats repeat "ok", "haha", forwards...) and rows flagged in `skip`,
+    # such as media placeholders and system notifications, score 0.0.
+    # progress(done, total) counts distinct texts, after every chunk.
+    messages = pd.Series(messages, copy=False).astype(str).to_numpy()
+    scores = np.zeros(len(messages), dtype=np.float64)
+
+    if skip is None:
+        positions = np.arange(len(messages))
+    else:
+        positions = np.flatnonzero(~np.asarray(skip, dtype=bool))
+
+    codes, uniques = pd.factorize(messages[positions])
+    unique_scores = _score_texts(uniques.tolist(), processes, progress)
+    scores[positions] = unique_scores[codes]
+    return scores
+
+
+def classify_codes(scores):
+    # Positive (2) from 0.05 up, Negative (0) from -0.05 down, Neutral (1) in between
+    scores = np.asarray(scores)
+    return np.select([scores >= 0.05, scores <= -0.05], [2, 0], 1)
+
 
-        # Compute sentiment scores
-        df_copy['sentiment_score'] = df_copy['message'].apply(lambda text: sia.polarity_scores(text)['compound'])
+def classify(scores):
+    return SENTIMENT_LABELS[classify_codes(scores)]
 
-        # Classify as Positive / Negative / Neutral
-        def classify(score):
-            if score >= 0.05:
-                return 'Positive'
-            elif score <= -0.05:
-                return 'Negative'
-            else:
-                return 'Neutral'
 
-        df_copy['sentiment'] = df_copy['sentiment_score'].apply(classify)
+def scores_name(key):
+    return f"{key}.sentiment.v{SCORES_VERSION}.npy"
+
+
+def cached_scores(chat):
+    # Scores already on the ChatIndex or on disk, without computing anything
+    if chat.sentiment_scores is None:
+        chat.sentiment_scores = cache.load_array(scores_name(chat.key))
+    return chat.sentiment_scores
+
+
+def chat_scores(chat, progress=None):
+    # Scores for every message of the chat, computed once and kept on the
+    # ChatIndex and on disk (keyed by the chat fingerprint)
+    scores = cached_scores(chat)
+    if scores is None:
+        scores = score_messages(chat.df['message'], progress=progress, skip=~chat.text_mask)
+        cache.store_array(scores_name(chat.key), scores)
+
+    chat.sentiment_scores = scores
+    return scores
+
+
+# The per-message frame is large and the scores are already on disk, so
+# results are only kept in memory
+@memoize(ignore=('progress',), spill=False)
+@profiled()
+def analyze_sentiment(df, selected_user='Overall', progress=None):
+    try:
+        chat = as_chat_index(df)
+        scores = chat_scores(chat, progress)
+
+        # Filter by user if needed; per-user views are just slices of the scores
+        rows = chat.rows(selected_user)
+        if rows is not None:
+            scores = scores[rows]
+        df = chat.frame(selected_user)
+
+        df_copy = df.assign(
+            sentiment_score=scores,
+            sentiment=classify(scores)
+        )
 
         # Aggregate counts
         sentiment_counts = df_copy['sentiment'].value_counts().reset_index()
@@ -36,4 +147,67 @@ def analyze_sentiment(df, selected_user='Overall'):
 
     except Exception as e:
         print(f"Error in analyze_sentiment: {e}")
-        return df, pd.DataFrame(columns=['Sentiment', 'Count'])
+        # Callers get a plain frame back, even when they passed a ChatIndex
+        frame = df if isinstance(df, pd.DataFrame) else df.df
+        return Fallback((frame, pd.DataFrame(columns=['Sentiment', 'Count'])))
+
+
+@memoize(spill=False)
+@profiled()
+def sample_sentiment(df, selected_user='Overall', fraction=SAMPLE_FRACTION, seed=0):
+    # Quick estimate of analyze_sentiment's counts from a sample of the
+    # messages, stratified by member so quiet members are represented too.
+    # Media and notifications always count as Neutral, so only text is
+    # sampled. Returns Sentiment, Share, Low, High (95% interval) and the
+    # estimated Count, plus the number of messages scored.
+    try:
+        chat = as_chat_index(df)
+        rows = chat.rows(selected_user)
+        rows = np.arange(len(chat)) if rows is None else np.asarray(rows)
+        total = len(rows)
+        text_rows = rows[chat.text_mask[rows]]
+        if total == 0:
+            return pd.DataFrame(columns=['Sentiment', 'Share', 'Low', 'High', 'Count']), 0
+
+        # At most SAMPLE_MAX_MESSAGES are scored, however big the chat
+        fraction = min(fraction, SAMPLE_MAX_MESSAGES / max(len(text_rows), 1))
+        rng = np.random.default_rng(seed)
+        strata = chat.codes[text_rows]
+        picks = []
+        for code in np.unique(strata):
+            members = text_rows[strata == code]
+            n = min(len(members), max(SAMPLE_MIN_PER_MEMBER, int(np.ceil(fraction * len(members)))))
+            picks.append((len(members), rng.choice(members, n, replace=False)))
+
+        # One scoring call, so texts repeated across members are scored once
+        picked = np.concatenate([p for _, p in picks]) if picks else np.zeros(0, dtype=np.int64)
+        codes = classify_codes(score_messages(chat.df['message'].iloc[picked], processes=1))
+
+        shares = np.zeros(len(SENTIMENT_LABELS))
+        variance = np.zeros(len(SENTIMENT_LABELS))
+        start = 0
+        for size, p in picks:
+            n = len(p)
+            share = np.bincount(codes[start:start + n], minlength=len(SENTIMENT_LABELS)) / n
+            start += n
+            weight = size / total
+            shares += weight * share
+            if n > 1:
+                # Finite population correction: a fully scored member adds no error
+                variance += weight ** 2 * (1 - n / size) * share * (1 - share) / (n - 1)
+        scored = len(picked)
+
+        shares[1] += (total - len(text_rows)) / total
+        margin = 1.96 * np.sqrt(variance)
+        estimate = pd.DataFrame({
+            'Sentiment': SENTIMENT_LABELS,
+            'Share': shares,
+            'Low': np.clip(shares - margin, 0, 1),
+            'High': np.clip(shares + margin, 0, 1),
+            'Count': np.round(shares * total).astype(np.int64),
+        })
+        return estimate.sort_values('Share', ascending=False, kind='stable').reset_index(drop=True), scored
+
+    except Exception as e:
+        print(f"Error in sample_sentiment: {e}")
+        return Fallback((pd.DataFrame(columns=['Sentiment', 'Share', 'Low', 'High', 'Count']), 0))
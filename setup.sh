@@ -6,4 +6,10 @@ port = $PORT\n\
 enableCORS = false\n\
 headless = true\n\
 \n\
-" > ~/.streamlit/config.toml
\ No newline at end of file
+" > ~/.streamlit/config.toml
+
+# VADER lexicon for sentiment analysis, fetched once into ./nltk_data so the
+# app never downloads anything while serving
+if [ ! -f nltk_data/sentiment/vader_lexicon.zip ]; then
+    python -m nltk.downloader -d nltk_data vader_lexicon
+fi
@@ -0,0 +1,282 @@
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from chat_index import as_chat_index
+from emojis import count_emojis
+from preprocessor import MONTH_DTYPE
+
+# Local store of many parsed chats for cross-chat analysis. Messages live in a
+# Parquet dataset partitioned by chat and month,
+#
+#   messages/chat_id=<id>/month=2023-04/part-0.parquet
+#   emojis/chat_id=<id>/month=2023-04/part-0.parquet   (user, emoji, count)
+#   chats/<id>.json                                     (name, size, dates)
+#
+# and the per-message work the single-chat app does lazily (media, links,
+# words, sentiment, emoji) is stored with it. The query functions mirror the
+# helper API over any subset of chats, users and months; they read only the
+# columns they need and pass the chat, month and user filters down to
+# pyarrow, so whole partitions and row groups are skipped and message text is
+# never loaded for a dashboard.
+
+STORE_DIR = Path(os.environ.get('CHAT_STORE_DIR', Path(__file__).with_name('chat_store')))
+
+PARTITIONING = ds.partitioning(pa.schema([('chat_id', pa.string()), ('month', pa.string())]), flavor='hive')
+
+# Rows are sorted by user inside each month so row-group statistics on
+# `user` let per-member queries skip most of a partition
+ROW_GROUP_SIZE = 64 * 1024
+
+
+def chat_id_for(name):
+    # Partition-safe id from a chat or file name
+    chat_id = re.sub(r'[^A-Za-z0-9_.-]+', '_', str(name)).strip('._')
+    return chat_id or 'chat'
+
+
+def _write(table, root, chat_id):
+    target = root / f"chat_id={chat_id}"
+    shutil.rmtree(target, ignore_errors=True)
+    if table.num_rows == 0:
+        return
+    ds.write_dataset(
+        table, root, format='parquet', partitioning=PARTITIONING, basename_template='part-{i}.parquet',
+        existing_data_behavior='overwrite_or_ignore', max_rows_per_group=ROW_GROUP_SIZE,
+    )
+
+
+def add_chat(df, chat_id=None, name=None, root=None, with_sentiment=False):
+    # Stores (or replaces) one parsed chat. `df` is a parsed frame or a
+    # ChatIndex; sentiment scores are included when they are already on the
+    # chat or in the cache, or computed when `with_sentiment` is set.
+    # Returns the chat id.
+    import sentiment
+
+    root = Path(root or STORE_DIR)
+    chat = as_chat_index(df)
+    chat_id = chat_id_for(chat_id or name or chat.key[:16])
+
+    frame = chat.df
+    months = frame['message_date'].dt.strftime('%Y-%m')
+    scores = sentiment.chat_scores(chat) if with_sentiment else sentiment.cached_scores(chat)
+
+    messages = pd.DataFrame({
+        'chat_id': chat_id,
+        'month': months,
+        'message_date': frame['message_date'],
+        'user': frame['user'].astype(str),
+        'message': frame['message'],
+        'is_media': chat.media_mask,
+        'links': chat.link_counts.astype(np.int32),
+        'words': chat.word_counts.astype(np.int32),
+        'sentiment': np.full(len(frame), np.nan, dtype=np.float32) if scores is None else scores.astype(np.float32),
+    })
+    messages = messages.sort_values(['month', 'user', 'message_date'], kind='stable')
+    _write(pa.Table.from_pandas(messages, preserve_index=False), root / 'messages', chat_id)
+
+    # Emoji per (month, user) in one scan over the chat
+    month_codes, month_labels = pd.factorize(months)
+    groups = month_codes.astype(np.int64) * len(chat.users) + chat.codes
+    found = count_emojis(frame['message'], groups)
+    group = found.index.get_level_values(0).to_numpy()
+    emojis = pd.DataFrame({
+        'chat_id': chat_id,
+        'month': np.asarray(month_labels)[group // len(chat.users)],
+        'user': np.asarray(chat.users.astype(str))[group % len(chat.users)],
+        'emoji': found.index.get_level_values(1).astype(str),
+        'count': found.to_numpy(dtype=np.int64),
+    })
+    _write(pa.Table.from_pandas(emojis, preserve_index=False), root / 'emojis', chat_id)
+
+    info = {
+        'chat_id': chat_id,
+        'name': name or chat_id,
+        'key': chat.key,
+        'messages': len(frame),
+        'users': [str(u) for u in chat.users if u != 'group_notification'],
+        'first_message': str(frame['message_date'].min()),
+        'last_message': str(frame['message_date'].max()),
+        'date_format': frame.attrs.get('date_format'),
+        'has_sentiment': scores is not None,
+        'added': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    (root / 'chats').mkdir(parents=True, exist_ok=True)
+    with open(root / 'chats' / f"{chat_id}.json", 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    return chat_id
+
+
+def remove_chat(chat_id, root=None):
+    # Drops one chat's messages, emoji and info; False when it was not stored
+    root = Path(root or STORE_DIR)
+    info = root / 'chats' / f"{chat_id}.json"
+    found = info.exists()
+    for table in ('messages', 'emojis'):
+        target = root / table / f"chat_id={chat_id}"
+        found = found or target.exists()
+        shutil.rmtree(target, ignore_errors=True)
+    info.unlink(missing_ok=True)
+    return found
+    (root / 'chats' / f"{chat_id}.json").unlink(missing_ok=True)
+
+
+def list_chats(root=None):
+    # One row per stored chat
+    root = Path(root or STORE_DIR)
+    rows = []
+    for path in sorted((root / 'chats').glob('*.json')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                info = json.load(f)
+            info['users'] = len(info['users'])
+            rows.append(info)
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+    return pd.DataFrame(rows, columns=['chat_id', 'name', 'messages', 'users', 'first_message', 'last_message',
+                                       'has_sentiment', 'added'])
+
+
+def _dataset(table, root):
+    path = Path(root or STORE_DIR) / table
+    if not path.exists():
+        return None
+    return ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+
+
+def _filter(chats=None, selected_user='Overall', start=None, end=None):
+    # chats: ids to include (None for all); start/end: 'YYYY-MM', inclusive
+    conditions = []
+    if chats is not None:
+        conditions.append(ds.field('chat_id').isin([chat_id_for(c) for c in chats]))
+    if selected_user != 'Overall':
+        conditions.append(ds.field('user') == selected_user)
+    if start:
+        conditions.append(ds.field('month') >= start)
+    if end:
+        conditions.append(ds.field('month') <= end)
+    if not conditions:
+        return None
+    condition = conditions[0]
+    for c in conditions[1:]:
+        condition = condition & c
+    return condition
+
+
+def _read(table, columns, root=None, **filters):
+    dataset = _dataset(table, root)
+    if dataset is None:
+        return pa.table({c: pa.array([], pa.string()) for c in columns})
+    return dataset.to_table(columns=columns, filter=_filter(**filters))
+
+
+def _counts(table, keys, value=None):
+    # Grouped row counts (or sums of `value`) as a DataFrame
+    if value is None:
+        grouped = table.group_by(keys).aggregate([([], 'count_all')])
+        return grouped.to_pandas().rename(columns={'count_all': 'count'})
+    grouped = table.group_by(keys).aggregate([(value, 'sum')])
+    return grouped.to_pandas().rename(columns={f'{value}_sum': value})
+
+
+def chat_stats(chats=None, selected_user='Overall', start=None, end=None, root=None):
+    # fetch_stats for every chat: messages, words, media and links per chat
+    table = _read('messages', ['chat_id', 'words', 'is_media', 'links'], root,
+                  chats=chats, selected_user=selected_user, start=start, end=end)
+    columns = ['messages', 'words', 'media', 'links']
+    if table.num_rows == 0:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name='chat_id'))
+    position = table.schema.get_field_index('is_media')
+    table = table.set_column(position, 'is_media', pc.cast(table['is_media'], pa.int64()))
+    stats = table.group_by('chat_id').aggregate([
+        ([], 'count_all'), ('words', 'sum'), ('is_media', 'sum'), ('links', 'sum'),
+    ]).to_pandas()
+    stats.columns = [{'count_all': 'messages', 'words_sum': 'words', 'is_media_sum': 'media',
+                      'links_sum': 'links'}.get(c, c) for c in stats.columns]
+    return stats.set_index('chat_id')[columns].sort_index()
+
+
+def most_busy_users(chats=None, start=None, end=None, by_chat=False, root=None):
+    # Like helper.most_busy_users over the selected chats: the top five
+    # members by messages and everyone's share in percent. With `by_chat`
+    # members are counted separately in every chat.
+    keys = ['chat_id', 'user'] if by_chat else ['user']
+    table = _read('messages', keys, root, chats=chats, start=start, end=end)
+    if table.num_rows == 0:
+        return pd.Series(dtype=np.int64, name='count'), pd.DataFrame(columns=keys[:-1] + ['name', 'percent'])
+    counts = _counts(table, keys).set_index(keys)['count'].sort_values(ascending=False, kind='stable')
+    percent = round(counts / table.num_rows * 100, 2).reset_index()
+    percent.columns = keys[:-1] + ['name', 'percent']
+    return counts.head(), percent
+
+
+def monthly_timeline(chats=None, selected_user='Overall', start=None, end=None, by_chat=False, root=None):
+    # Like helper.monthly_timeline (year, month, message, time, with empty
+    # months as zeros) for the selected chats together, or one column of
+    # counts per chat with `by_chat`. Only the partition columns are read.
+    columns = ['chat_id', 'month']
+    if selected_user != 'Overall':
+        columns.append('user')
+    table = _read('messages', columns, root, chats=chats, selected_user=selected_user, start=start, end=end)
+    if table.num_rows == 0:
+        return pd.DataFrame(columns=['year', 'month', 'message', 'time'])
+
+    counts = _counts(table, ['chat_id', 'month'])
+    counts['month'] = pd.PeriodIndex(counts['month'], freq='M')
+    if by_chat:
+        counts = counts.pivot(index='month', columns='chat_id', values='count')
+    else:
+        counts = counts.groupby('month')['count'].sum()
+    periods = pd.period_range(counts.index.min(), counts.index.max(), freq='M')
+    counts = counts.reindex(periods, fill_value=0).fillna(0).astype(np.int64)
+
+    timeline = pd.DataFrame({
+        'year': periods.year,
+        'month': pd.Categorical.from_codes(periods.month - 1, dtype=MONTH_DTYPE),
+    })
+    if by_chat:
+        for chat_id in counts.columns:
+            timeline[chat_id] = counts[chat_id].to_numpy()
+    else:
+        timeline['message'] = counts.to_numpy()
+    timeline['time'] = timeline['month'].astype(str) + '-' + timeline['year'].astype(str)
+    return timeline
+
+
+def emoji_helper(chats=None, selected_user='Overall', start=None, end=None, root=None):
+    # Like helper.emoji_helper over the selected chats; reads the small
+    # per-month emoji table, not the messages
+    table = _read('emojis', ['emoji', 'count'], root, chats=chats, selected_user=selected_user, start=start, end=end)
+    if table.num_rows == 0:
+        return pd.DataFrame(columns=['Emoji', 'Count'])
+    counts = _counts(table, ['emoji'], 'count').sort_values(['count', 'emoji'], ascending=[False, True], kind='stable')
+    return pd.DataFrame({'Emoji': counts['emoji'].to_numpy(), 'Count': counts['count'].to_numpy()})
+
+
+def sentiment_distribution(chats=None, selected_user='Overall', start=None, end=None, by_chat=False, root=None):
+    # Sentiment / Count like the counts of sentiment.analyze_sentiment, from
+    # the stored scores. Chats stored without scores are left out.
+    from sentiment import classify
+
+    table = _read('messages', ['chat_id', 'sentiment'], root,
+                  chats=chats, selected_user=selected_user, start=start, end=end)
+    table = table.filter(pc.is_valid(table['sentiment'])) if table.num_rows else table
+    columns = (['chat_id'] if by_chat else []) + ['Sentiment', 'Count']
+    if table.num_rows == 0:
+        return pd.DataFrame(columns=columns)
+
+    labels = pd.Series(classify(table['sentiment'].to_numpy()), name='Sentiment')
+    if not by_chat:
+        counts = labels.value_counts().reset_index()
+        counts.columns = columns
+        return counts
+    counts = pd.DataFrame({'chat_id': table['chat_id'].to_numpy(), 'Sentiment': labels})
+    counts = counts.groupby(['chat_id', 'Sentiment']).size().rename('Count').reset_index()
+    return counts.sort_values(['chat_id', 'Count'], ascending=[True, False], kind='stable').reset_index(drop=True)
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+import batch
+import cache
+import sentiment
+
+EXPORT = """\
+12/03/21, 09:15 - Asha: good morning 😀
+12/03/21, 09:16 - Ravi: see example.com for the plan
+12/03/21, 09:20 - Asha: <Media omitted>
+13/03/21, 21:05 - Ravi: this is terrible news
+13/03/21, 21:07 - Asha: haha ok 👍
+"""
+
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'ENABLED', False)
+    path = tmp_path / 'chat.txt'
+    path.write_text(EXPORT, encoding='utf-8')
+    return path
+
+
+def test_analyse_chat_writes_summary(export, tmp_path):
+    record = batch.analyse_chat(export, tmp_path / 'out', with_sentiment=False, use_cache=False)
+    assert record['status'] == 'ok'
+    summary = json.loads((tmp_path / 'out' / 'summary.json').read_text(encoding='utf-8'))
+    assert summary['messages'] == 5
+    assert summary['links'] == 1
+    assert summary['sentiment'] is None
+
+
+def test_analyse_chat_without_lexicon(export, tmp_path, monkeypatch):
+    # A missing VADER lexicon only drops the sentiment results
+    def missing():
+        raise LookupError("Resource vader_lexicon not found.")
+
+    monkeypatch.setattr(sentiment, 'get_analyzer', missing)
+    record = batch.analyse_chat(export, tmp_path / 'out', use_cache=False)
+    assert record['status'] == 'ok'
+    summary = json.loads((tmp_path / 'out' / 'summary.json').read_text(encoding='utf-8'))
+    assert summary['messages'] == 5
+    assert summary['sentiment'] is None
+    assert not (tmp_path / 'out' / 'sentiment_by_user.parquet').exists()
+
+
+def test_store_add_and_remove(export, tmp_path):
+    import store
+
+    root = tmp_path / 'store'
+    assert batch.main([str(export), '-o', str(tmp_path / 'out'), '--no-cache', '--no-sentiment',
+                       '--store', str(root)]) == 0
+    assert store.list_chats(root)['chat_id'].tolist() == ['chat']
+    assert int(store.monthly_timeline(root=root)['message'].sum()) == 5
+
+    assert batch.main(['--store', str(root), '--remove', 'chat']) == 0
+    assert store.list_chats(root).empty
+    assert not any(root.glob('*/chat_id=chat'))
+    assert not store.remove_chat('chat', root=root)
+
+
+def test_remove_needs_store():
+    with pytest.raises(SystemExit):
+        batch.main(['--remove', 'chat'])
@@ -0,0 +1,51 @@
+import emoji
+import pandas as pd
+import pytest
+
+import emojis
+
+# Whole sequences, not the code points they are built from
+COMPOUND = {
+    'family 👨‍👩‍👧 here': ['👨‍👩‍👧'],
+    'couple 👩‍❤️‍👨 and kiss 👩‍❤️‍💋‍👨': ['👩‍❤️‍👨', '👩‍❤️‍💋‍👨'],
+    'technologist 🧑🏾‍💻 at work': ['🧑🏾‍💻'],
+    'thumbs 👍🏽👍': ['👍🏽', '👍'],
+    'wave 👋🏻👋🏿': ['👋🏻', '👋🏿'],
+    'flags 🇮🇳🇺🇸': ['🇮🇳', '🇺🇸'],
+    'subdivision 🏴󠁧󠁢󠁳󠁣󠁴󠁿 flag': ['🏴󠁧󠁢󠁳󠁣󠁴󠁿'],
+    'keycap #️⃣ 1️⃣ but not #tag or 10:30': ['#️⃣', '1️⃣'],
+    'heart ❤️ and bare ❤': ['❤️', '❤'],
+    'rainbow flag 🏳️‍🌈': ['🏳️‍🌈'],
+    'lonely tone 🏽': ['🏽'],
+    'no emoji at all': [],
+    '': [],
+}
+
+
+@pytest.mark.parametrize('text, expected', list(COMPOUND.items()))
+def test_find_emojis_keeps_sequences_whole(text, expected):
+    assert emojis.find_emojis(text) == expected
+
+
+def test_every_known_emoji_is_found_alone():
+    missed = [e for e in emoji.EMOJI_DATA if emojis.find_emojis(f"a{e} b") != [e]]
+    assert missed == []
+
+
+def test_count_emojis_golden():
+    messages = pd.Series(['😂 👍🏽 🇮🇳', '😂', '😂😂 👨‍👩‍👧', 'plain', None, '<Media omitted>'])
+    counts = emojis.count_emojis(messages)
+    assert counts.to_dict() == {'😂': 4, '👍🏽': 1, '🇮🇳': 1, '👨‍👩‍👧': 1}
+    assert list(counts.index[:1]) == ['😂']
+    assert counts.index.name == 'Emoji' and counts.name == 'Count'
+
+
+def test_count_emojis_per_user():
+    users = pd.Series(['A', 'B', 'A', 'B'])
+    counts = emojis.count_emojis(pd.Series(['😂 👍🏽', '😂', '😂😂', 'no emoji']), users)
+    assert counts.to_dict() == {('A', '👍🏽'): 1, ('A', '😂'): 3, ('B', '😂'): 1}
+
+
+def test_count_emojis_empty():
+    assert emojis.count_emojis(pd.Series(['hi', 'there'])).empty
+    assert emojis.count_emojis(pd.Series([], dtype=object), pd.Series([], dtype=object)).empty
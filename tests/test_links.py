@@ -0,0 +1,58 @@
+import re
+
+import pandas as pd
+import pytest
+
+import links
+
+# message -> links URLExtract finds in it
+COUNTS = {
+    'example.com': 1,
+    'visit google.co.in today': 1,
+    'a.in b.co.uk': 2,
+    'ip 192.168.1.1 is the router': 1,
+    'http://10.0.0.1:8080/x': 1,
+    'server on http://localhost:8501 is up': 1,
+    'see example.com.': 1,
+    'see example.com,': 1,
+    'is it example.org?': 1,
+    '(github.com/streamlit)': 1,
+    'https://en.wikipedia.org/wiki/WhatsApp#History.': 1,
+    'done.': 0,
+    'haha...': 0,
+    'ok. bye': 0,
+    'see you at 10.30': 0,
+    'version 1.2.3': 0,
+    'someone@gmail.com': 0,
+    'no link here': 0,
+    '<Media omitted>': 0,
+    '': 0,
+}
+
+# Edge cases where only agreement with URLExtract matters
+EDGE_CASES = ['LOCALHOST:3000 works', 'localhost', 'go to www.test.org!', 'e.g. this', 'mr.bean', 'file_name.txt']
+
+
+def find_urls_counts(messages):
+    extract = links.get_extractor()
+    return [len(extract.find_urls(m)) if isinstance(m, str) else 0 for m in messages]
+
+
+@pytest.mark.parametrize('message, expected', list(COUNTS.items()))
+def test_count_links(message, expected):
+    assert links.count_links([message], processes=1).tolist() == [expected]
+
+
+def test_same_as_find_urls_on_every_message():
+    messages = pd.Series(list(COUNTS) + EDGE_CASES + [None])
+    assert links.count_links(messages, processes=1).tolist() == find_urls_counts(messages)
+
+
+@pytest.mark.parametrize('message', [m for m, n in COUNTS.items() if n] + ['localhost', 'LOCALHOST:3000 works'])
+def test_prefilter_keeps_every_candidate(message):
+    assert re.search(links.CANDIDATE_PATTERN, message, re.IGNORECASE)
+
+
+@pytest.mark.parametrize('message', ['done.', 'haha...', 'ok. bye', 'no link here', '<Media omitted>', 'wait.. what'])
+def test_prefilter_skips_sentence_punctuation(message):
+    assert not re.search(links.CANDIDATE_PATTERN, message, re.IGNORECASE)
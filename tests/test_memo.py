@@ -0,0 +1,52 @@
+import pytest
+
+import cache
+import memo
+import preprocessor
+from chat_index import ChatIndex
+
+EXPORT = """\
+12/03/21, 09:15 - Asha: good morning
+12/03/21, 09:16 - Ravi: morning
+13/03/21, 21:05 - Asha: night
+"""
+
+
+@memo.memoize(version=1)
+def message_count(df, selected_user='Overall'):
+    return len(df.frame(selected_user))
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    # One entry in memory, so every new result pushes the previous one out
+    monkeypatch.setattr(memo, 'MAX_ENTRIES', 1)
+    monkeypatch.setattr(memo, 'stats', dict(memo.stats, spilled=0))
+    memo.clear()
+    yield ChatIndex(preprocessor.preprocess(EXPORT))
+    memo.clear()
+
+
+def test_results_are_cached(chat):
+    assert message_count(chat) == 3
+    hits = memo.stats['hits']
+    assert message_count(chat) == 3
+    assert memo.stats['hits'] == hits + 1
+
+
+def test_nothing_spilled_without_the_disk_cache(chat, monkeypatch):
+    monkeypatch.setattr(cache, 'ENABLED', False)
+    assert [message_count(chat, user) for user in ('Overall', 'Asha', 'Ravi')] == [3, 2, 1]
+    assert memo.stats['spilled'] == 0
+
+
+def test_evicted_results_spill_to_disk(chat, monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, 'ENABLED', True)
+    monkeypatch.setattr(cache, 'CACHE_DIR', tmp_path)
+    assert [message_count(chat, user) for user in ('Overall', 'Asha', 'Ravi')] == [3, 2, 1]
+    assert memo.stats['spilled'] == 2
+    assert len(list(tmp_path.glob('*.memo.*'))) == 2
+    # A spilled result is read back instead of recomputed
+    spill_hits = memo.stats['spill_hits']
+    assert message_count(chat, 'Overall') == 3
+    assert memo.stats['spill_hits'] == spill_hits + 1
@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+
+import preprocessor
+
+EXPORT = """\
+12/03/21, 09:15 - Messages and calls are end-to-end encrypted. No one outside of this chat can read them.
+12/03/21, 09:15 - Asha: good morning 😀
+12/03/21, 09:16 - Ravi: see example.com: the plan
+is on page 2
+and page 3
+12/03/21, 09:20 - Asha: <Media omitted>
+13/03/21, 21:05 - Ravi: 10/03/21 was a long day
+13/03/21, 21:07 - Asha: haha ok 👍
+25/03/21, 23:59 - Ravi left
+"""
+
+
+def columns(df):
+    return df[['message_date', 'user', 'message']].assign(user=df['user'].astype(str), message=df['message'].astype(str))
+
+
+def test_preprocess_export():
+    df = preprocessor.preprocess(EXPORT)
+    assert len(df) == 7
+    assert df.attrs['date_format'] == '%d/%m/%y, %H:%M'
+    assert df['message_date'].iloc[-1] == pd.Timestamp('2021-03-25 23:59')
+    assert df['user'].astype(str).tolist() == [
+        'group_notification', 'Asha', 'Ravi', 'Asha', 'Ravi', 'Asha', 'group_notification'
+    ]
+    assert df['message'].iloc[2] == 'see example.com: the plan\nis on page 2\nand page 3'
+    assert df['month'].iloc[0] == 'March' and df['day_name'].iloc[0] == 'Friday'
+
+
+@pytest.mark.parametrize('chunk_size', [1, 64, 777])
+def test_chunk_size_does_not_change_the_result(chunk_size):
+    expected = preprocessor.preprocess(EXPORT * 20)
+    df = preprocessor.preprocess_stream(EXPORT * 20, chunk_size=chunk_size)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+@pytest.mark.parametrize('batch_size', [1, 3, 5])
+def test_batch_size_does_not_change_the_result(batch_size):
+    expected = preprocessor.preprocess(EXPORT)
+    df = preprocessor.preprocess_stream(EXPORT, chunk_size=64, batch_size=batch_size)
+    pd.testing.assert_frame_equal(columns(df), columns(expected))
+
+
+# Early batches where every date reads both ways must be parsed with the
+# order a later batch settles, not guessed one batch at a time
+HELD = [
+    ('03/04/21, 10:00 - A: one\n04/05/21, 10:00 - B: two\n05/06/21, 10:00 - A: three\n', '13/06/21, 10:00 - B: four\n',
+     '%d/%m/%y, %H:%M', ['2021-04-03', '2021-05-04', '2021-06-05', '2021-06-13']),
+    ('03/04/21, 10:00 - A: one\n04/05/21, 10:00 - B: two\n05/06/21, 10:00 - A: three\n', '06/13/21, 10:00 - B: four\n',
+     '%m/%d/%y, %H:%M', ['2021-03-04', '2021-04-05', '2021-05-06', '2021-06-13']),
+]
+
+
+@pytest.mark.parametrize('head, tail, date_format, days', HELD)
+@pytest.mark.parametrize('batch_size', [1, 2])
+def test_held_batches_use_the_settled_order(head, tail, date_format, days, batch_size):
+    df = preprocessor.preprocess_stream(head + tail, chunk_size=16, batch_size=batch_size)
+    assert df.attrs['date_format'] == date_format
+    assert df['only_date'].dt.strftime('%Y-%m-%d').tolist() == days
+    assert df['message'].astype(str).tolist() == ['one', 'two', 'three', 'four']
+
+
+# The same three messages written in every time layout
+LAYOUTS = {
+    '%H:%M': ['14/02/22, 09:05 - A: a', '14/02/22, 13:30 - B: b', '15/02/22, 00:00 - A: c'],
+    '%H:%M:%S': ['14/02/22, 09:05:07 - A: a', '14/02/22, 13:30:00 - B: b', '15/02/22, 00:00:59 - A: c'],
+    '%I:%M %p': ['14/02/22, 9:05 AM - A: a', '14/02/22, 1:30 PM - B: b', '15/02/22, 12:00 AM - A: c'],
+    '%I:%M:%S %p': ['14/02/22, 9:05:07 am - A: a', '14/02/22, 1:30:00 pm - B: b', '15/02/22, 12:00:59 am - A: c'],
+}
+
+
+@pytest.mark.parametrize('time_format, lines', list(LAYOUTS.items()))
+def test_time_layouts(time_format, lines):
+    df = preprocessor.preprocess('\n'.join(lines) + '\n')
+    assert df.attrs['date_format'] == f'%d/%m/%y, {time_format}'
+    seconds = [7, 0, 59] if '%S' in time_format else [0, 0, 0]
+    assert df['message_date'].tolist() == [
+        pd.Timestamp(2022, 2, 14, 9, 5, seconds[0]),
+        pd.Timestamp(2022, 2, 14, 13, 30, seconds[1]),
+        pd.Timestamp(2022, 2, 15, 0, 0, seconds[2]),
+    ]
+    assert df['hour'].tolist() == [9, 13, 0]
+    assert df['message'].astype(str).tolist() == ['a', 'b', 'c']
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'utf-8-sig', 'utf-16', 'utf-16-le', 'utf-16-be'])
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_encodings_and_line_endings(encoding, newline):
+    expected = preprocessor.preprocess(EXPORT)
+    data = EXPORT.replace('\n', newline).encode(encoding)
+    if encoding in ('utf-16-le', 'utf-16-be'):
+        # Exports from some phones carry the byte order mark
+        data = '\ufeff'.encode(encoding) + data
+    df = preprocessor.preprocess_stream(data, chunk_size=64)
+    assert df['message_date'].tolist() == expected['message_date'].tolist()
+    assert df['user'].astype(str).tolist() == expected['user'].astype(str).tolist()
+    messages = df['message'].astype(str).str.replace('\r\n', '\n')
+    assert messages.tolist() == expected['message'].astype(str).tolist()
+
+
+def test_no_messages():
+    assert preprocessor.preprocess('just some text\nwithout any dates\n').empty
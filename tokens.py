@@ -0,0 +1,45 @@
+import hashlib
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from profiling import profiled
+
+STOP_WORDS_PATH = Path(__file__).with_name('stop_hinglish.txt')
+
+
+def load_stop_words(path=STOP_WORDS_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return frozenset(f.read().splitlines())
+    except OSError:
+        return frozenset()
+
+
+# Read once per process instead of on every helper call
+STOP_WORDS = load_stop_words()
+STOP_WORDS_KEY = hashlib.blake2b('\n'.join(sorted(STOP_WORDS)).encode('utf-8'), digest_size=8).hexdigest()
+
+
+@profiled()
+def tokenize(messages, users, keep):
+    # One tokenization pass for the whole chat. Returns
+    #   word_counts: words per message (plain whitespace split, like str.split())
+    #   term_counts: Series indexed by (user, token) with lowercased tokens
+    #                from the `keep` messages, stop words removed, ordered by
+    #                first occurrence so ties break like Counter.most_common()
+    split = pd.Series(messages, copy=False).str.lower().str.split()
+    word_counts = split.str.len().fillna(0).to_numpy(dtype=np.int64)
+
+    positions = np.flatnonzero(np.asarray(keep, dtype=bool))
+    tokens = pd.Series(split.to_numpy()[positions], index=positions).explode().dropna()
+    tokens = tokens[~tokens.isin(STOP_WORDS)]
+    if tokens.empty:
+        empty = pd.MultiIndex.from_arrays([[], []], names=['user', 'token'])
+        return word_counts, pd.Series([], index=empty, dtype=np.int64)
+
+    term_counts = tokens.groupby(
+        [pd.Series(users, copy=False).to_numpy()[tokens.index.to_numpy(dtype=np.int64)], tokens.to_numpy()],
+        sort=False
+    ).size()
+    term_counts.index.names = ['user', 'token']
+    return word_counts, term_counts